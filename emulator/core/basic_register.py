@@ -1,152 +1,136 @@
-
-
-
+REG_B = 0
+REG_C = 1
+REG_D = 2
+REG_E = 3
+REG_H = 4
+REG_L = 5
+REG_F = 6
+REG_A = 7
+
+ZERO_FLAG = 0x80
+NEGATIVE_FLAG = 0x40
+HALF_CARRY_FLAG = 0x20
+CARRY_FLAG = 0x10
+
+REGISTER_INDEX = {
+    'A': REG_A,
+    'B': REG_B,
+    'C': REG_C,
+    'D': REG_D,
+    'E': REG_E,
+    'H': REG_H,
+    'L': REG_L,
+    'F': REG_F
+}
+
+def pack_flags(zero, negative, half_carry, carry):
+    return (ZERO_FLAG if zero else 0x00) | (NEGATIVE_FLAG if negative else 0x00) | (HALF_CARRY_FLAG if half_carry else 0x00) | (CARRY_FLAG if carry else 0x00)
+
+
+## The whole register file lives in one bytearray indexed by the REG_* numbers,
+## with F stored already packed, so the CPU handlers index it directly
 class Registers:
-    _a = 0x00
-    _b = 0x00
-    _c = 0x00
-    _d = 0x00
-    _e = 0x00
-    _h = 0x00
-    _l = 0x00
-
-    zero:bool = False
-    negative:bool = False
-    half_carry:bool = False
-    carry:bool = False
-
-    def __init__(self):    
-        self._get_8_map = {
-            'A': lambda : self._a,
-            'B': lambda : self._b,
-            'C': lambda : self._c,
-            'D': lambda : self._d,
-            'E': lambda : self._e,
-            'H': lambda : self._h,
-            'L': lambda : self._l,
-            'F': lambda : self.get_f()
-        }
-
-        self._set_8_map = {
-            'A': self.set_a,
-            'B': self.set_b,
-            'C': self.set_c,
-            'D': self.set_d,
-            'E': self.set_e,
-            'H': self.set_h,
-            'L': self.set_l,
-            'F': self.set_f
-        }
-
-        self._get_16_map = {
-            'BC': self.get_bc,
-            'DE': self.get_de,
-            'HL': self.get_hl,
-            'AF': self.get_af
-        }
-
-        self._set_16_map = {
-            'BC': self.set_bc,
-            'DE': self.set_de,
-            'HL': self.set_hl,
-            'AF': self.set_af
-        }
+    __slots__ = ('file',)
+
+    def __init__(self):
+        self.file = bytearray(8)
 
     def get_a(self):
-        return self._a 
-    
+        return self.file[REG_A]
+
     def set_a(self, value):
-        self._a = value
+        self.file[REG_A] = value
 
     def get_b(self):
-        return self._b 
-    
+        return self.file[REG_B]
+
     def set_b(self, value):
-        self._b = value
+        self.file[REG_B] = value
 
     def get_c(self):
-        return self._c
-    
+        return self.file[REG_C]
+
     def set_c(self, value):
-        self._c = value
-    
+        self.file[REG_C] = value
+
     def get_d(self):
-        return self._d 
-    
+        return self.file[REG_D]
+
     def set_d(self, value):
-        self._d = value
+        self.file[REG_D] = value
 
     def get_e(self):
-        return self._e 
-    
+        return self.file[REG_E]
+
     def set_e(self, value):
-        self._e = value
+        self.file[REG_E] = value
 
     def get_h(self):
-        return self._h 
-    
+        return self.file[REG_H]
+
     def set_h(self, value):
-        self._h = value
+        self.file[REG_H] = value
 
     def get_l(self):
-        return self._l 
-    
+        return self.file[REG_L]
+
     def set_l(self, value):
-        self._l = value
+        self.file[REG_L] = value
 
     def get_f(self):
-        z = 0x1 if self.zero else 0x0
-        n = 0x1 if self.negative else 0x0
-        h = 0x1 if self.half_carry else 0x0
-        c = 0x1 if self.carry else 0x0
-        return z << 7 | n << 6 | h << 5 | c << 4
-    
+        return self.file[REG_F]
+
     def set_f(self, value):
-        self.zero = ((value & 0b10000000) >> 7) == 0x1
-        self.negative = ((value & 0b01000000) >> 6) == 0x1
-        self.half_carry = ((value & 0b00100000) >> 5) == 0x1
-        self.carry = ((value & 0b00010000) >> 4) == 0x1
+        self.file[REG_F] = value & 0xF0
+
+    @property
+    def zero(self):
+        return bool(self.file[REG_F] & ZERO_FLAG)
+
+    @property
+    def negative(self):
+        return bool(self.file[REG_F] & NEGATIVE_FLAG)
+
+    @property
+    def half_carry(self):
+        return bool(self.file[REG_F] & HALF_CARRY_FLAG)
+
+    @property
+    def carry(self):
+        return bool(self.file[REG_F] & CARRY_FLAG)
 
     def get_hl(self):
-        return (self._h << 8) | (self._l)
-    
+        file = self.file
+        return file[REG_H] << 8 | file[REG_L]
+
     def get_bc(self):
-        return (self._b << 8) | (self._c)
-    
+        file = self.file
+        return file[REG_B] << 8 | file[REG_C]
+
     def get_de(self):
-        return (self._d << 8) | (self._e)
-    
+        file = self.file
+        return file[REG_D] << 8 | file[REG_E]
+
     def get_af(self):
-        return (self._a << 8) | self.get_f()
-    
+        file = self.file
+        return file[REG_A] << 8 | file[REG_F]
+
     def set_hl(self, value):
-        self._h = value >> 8
-        self._l = value & 0xFF
+        file = self.file
+        file[REG_H] = value >> 8
+        file[REG_L] = value & 0xFF
 
     def set_bc(self, value):
-        self._b = value >> 8
-        self._c = value & 0xFF
+        file = self.file
+        file[REG_B] = value >> 8
+        file[REG_C] = value & 0xFF
 
     def set_de(self, value):
-        self._d = value >> 8
-        self._e = value & 0xFF
+        file = self.file
+        file[REG_D] = value >> 8
+        file[REG_E] = value & 0xFF
 
     def set_af(self, value):
-        self._a = value >> 8
-        self.set_f(value & 0xFF)
-
-    def get_8_from_id(self, id):
-        get_func = self._get_8_map[id]
-        return get_func()
-    
-    def set_8_from_id(self, id, value):
-        set_func = self._set_8_map[id]
-        set_func(value)
-
-    def get_16_from_id(self, id):
-        get_func = self._get_16_map[id]
-        return get_func()
-
-    def set_16_from_id(self, id, value):
-        set_func = self._set_16_map[id]
-        set_func(value)
\ No newline at end of file
+        file = self.file
+        file[REG_A] = value >> 8
+        file[REG_F] = value & 0xF0
@@ -0,0 +1,285 @@
+from emulator.core.instructions_dict import *
+from emulator.core.bus import *
+
+MAX_BLOCK_LENGTH = 32
+
+## Instructions that change the control flow or the interrupt state always close a block
+BLOCK_TERMINATORS = {'JP', 'JPR', 'CALL', 'RET', 'RETI', 'RST', 'HALT', 'STOP', 'EI', 'DI'}
+
+## Memory writes can switch ROM banks, poke IO registers or overwrite cached RAM code, so they also close the block
+MEMORY_WRITE_INSTRUCTIONS = {'INC', 'DEC', 'RL', 'RLC', 'RR', 'RRC', 'SLA', 'SRA', 'SRL', 'SWAP', 'RES', 'SET'}
+
+## Generated code indexes the flat register file directly, see basic_register.REG_*
+REGISTER_SOURCE = {
+    'A': 'f[7]',
+    'B': 'f[0]',
+    'C': 'f[1]',
+    'D': 'f[2]',
+    'E': 'f[3]',
+    'H': 'f[4]',
+    'L': 'f[5]'
+}
+
+REGISTER_PAIRS = {
+    'BC': ('f[0]', 'f[1]'),
+    'DE': ('f[2]', 'f[3]'),
+    'HL': ('f[4]', 'f[5]')
+}
+
+HL_SOURCE = '(f[4] << 8 | f[5])'
+
+NOT_COMPILED = object()
+
+
+class BlockCompiler:
+    compiled_blocks = 0
+    interpreted_blocks = 0
+    invalidated_blocks = 0
+    page_invalidations = 0
+
+    def __init__(self, cpu):
+        self.cpu = cpu
+        self.memory_bus = cpu.memory_bus
+        self.memory_bus.register_code_invalidation_handler(self.invalidate_page)
+        self.blocks = {}
+        self.ram_blocks = {}
+        self.page_blocks = {}
+
+    def invalidate(self):
+        for page in self.page_blocks:
+            self.memory_bus.unwatch_code_page(page)
+        self.blocks = {}
+        self.ram_blocks = {}
+        self.page_blocks = {}
+
+    def get_block(self, pc):
+        if pc <= ROM_BANK_N_END:
+            ## ROM blocks are keyed by their physical address, so every (bank, PC) pair has its own entry
+            key = pc if pc < ROM_BANK_N_BEGIN else pc + self.memory_bus.cartridge.rom_bank_offset
+            block = self.blocks.get(key, NOT_COMPILED)
+            if block is NOT_COMPILED:
+                block = self.blocks[key] = self.compile_block(pc, self.discover_block(pc))
+            return block
+
+        if not self.is_executable_ram(pc):
+            return None
+
+        block = self.ram_blocks.get(pc, NOT_COMPILED)
+        if block is NOT_COMPILED:
+            instructions = self.discover_block(pc)
+            block_end = instructions[-1][0] - 1 if instructions else pc
+            self.watch_block(pc, block_end)
+            block = self.ram_blocks[pc] = self.compile_block(pc, instructions)
+        return block
+
+    def is_executable_ram(self, pc):
+        if pc >= WORKING_RAM_BEGIN and pc <= WORKING_RAM_END:
+            return True
+        return pc >= ZERO_PAGE_BEGIN and pc <= ZERO_PAGE_END
+
+    ## Flags every page the block was decoded from, so MemoryBus.write_byte reports writes over it
+    def watch_block(self, start_pc, end_pc):
+        for page in range(start_pc >> CODE_PAGE_SHIFT, (end_pc >> CODE_PAGE_SHIFT) + 1):
+            self.page_blocks.setdefault(page, []).append(start_pc)
+            self.memory_bus.watch_code_page(page)
+
+    def invalidate_page(self, page):
+        self.page_invalidations += 1
+        for start_pc in self.page_blocks.pop(page, []):
+            if self.ram_blocks.pop(start_pc, NOT_COMPILED) is not NOT_COMPILED:
+                self.invalidated_blocks += 1
+
+    def compile_block(self, start_pc, instructions):
+        if not instructions:
+            self.interpreted_blocks += 1
+            return None
+
+        namespace = {
+            'cpu': self.cpu,
+            'f': self.cpu.registers.file,
+            'ADD_TABLE': ADD_TABLE,
+            'SUB_TABLE': SUB_TABLE,
+            'INC_TABLE': INC_TABLE,
+            'DEC_TABLE': DEC_TABLE,
+            'read_byte': self.memory_bus.read_byte,
+            'write_byte': self.memory_bus.write_byte
+        }
+
+        end_pc = instructions[-1][0]
+        total_cycles = sum(definition.cycles for _, definition, _, _ in instructions)
+        source = ['def block():']
+        for index, (next_pc, definition, handler, operands) in enumerate(instructions):
+            if index == len(instructions) - 1:
+                source.append('    cpu.program_counter = ' + hex(end_pc))
+                source.append('    cpu.clock_cycle = ' + str(total_cycles))
+
+            lines = self.emit_instruction(definition, operands)
+            if lines is None:
+                namespace['h' + str(index)] = handler
+                lines = ['h%d(%s)' % (index, hex(operands[1] << 8 | operands[0]))]
+            source += ['    ' + line for line in lines]
+        source.append('    return cpu.clock_cycle')
+
+        code = compile('\n'.join(source), '<block %s>' % hex(start_pc), 'exec')
+        exec(code, namespace)
+        self.compiled_blocks += 1
+        return namespace['block']
+
+    def discover_block(self, start_pc):
+        read_byte = self.memory_bus.read_byte
+        ## Bank 0 and the switchable bank are cached separately, so a block never crosses between them
+        if start_pc <= ROM_BANK_0_END:
+            region_end = ROM_BANK_0_END
+        elif start_pc <= ROM_BANK_N_END:
+            region_end = ROM_BANK_N_END
+        elif start_pc <= WORKING_RAM_END:
+            region_end = WORKING_RAM_END
+        else:
+            region_end = ZERO_PAGE_END
+
+        instructions = []
+        pc = start_pc
+        while len(instructions) < MAX_BLOCK_LENGTH:
+            opcode = read_byte(pc)
+            program_step = 1
+            if opcode == 0xCB:
+                opcode = read_byte(pc + 1)
+                program_step = 2
+                decoded = self.cpu._prefix_instruction_table[opcode]
+            else:
+                decoded = self.cpu._instruction_table[opcode]
+
+            if decoded is None:
+                break
+
+            definition, handler = decoded
+            operands = [0x00] * 2
+            for i in range(definition.operands_number):
+                operands[i] = read_byte(pc + program_step)
+                program_step += 1
+
+            if pc + program_step - 1 > region_end:
+                break
+
+            ## IO accesses at a known address are left to the interpreter, which steps the PPU/timer around them
+            if self.accesses_io(definition, operands):
+                break
+
+            pc += program_step
+            instructions.append((pc, definition, handler, operands))
+
+            decoded_inst = definition.name.split('_')
+            if decoded_inst[0] in BLOCK_TERMINATORS or self.writes_memory(decoded_inst):
+                break
+
+        return instructions
+
+    def accesses_io(self, definition, operands):
+        decoded_inst = definition.name.split('_')
+        if decoded_inst[0] == 'LDH':
+            return True
+        if decoded_inst[0] == 'LDP' and 'D16' in decoded_inst:
+            return (operands[1] << 8 | operands[0]) >= MEMORY_MAPPED_IO_BEGIN
+        return False
+
+    def writes_memory(self, decoded_inst):
+        base_inst = decoded_inst[0]
+        if base_inst in ('PUSH', 'LDS'):
+            return base_inst == 'PUSH' or decoded_inst[1] == 'D16'
+        if base_inst in ('LD', 'LDP', 'LDH'):
+            return decoded_inst[1] not in REGISTER_SOURCE
+        if base_inst in MEMORY_WRITE_INSTRUCTIONS:
+            return decoded_inst[1] == 'HL'
+        return False
+
+    def u8_source(self, operand_def, operands):
+        match operand_def:
+            case 'HL':
+                return 'read_byte(' + HL_SOURCE + ')'
+            case 'D8':
+                return hex(operands[0])
+            case _:
+                return REGISTER_SOURCE.get(operand_def)
+
+    ## Returns the inlined Python lines for an instruction, or None to call its decoded handler
+    def emit_instruction(self, definition:InstructionDefinition, operands):
+        decoded_inst = definition.name.split('_')
+        base_inst = decoded_inst[0]
+
+        match base_inst:
+            case 'NOP':
+                return []
+            case 'LD':
+                source = self.u8_source(decoded_inst[2], operands)
+                if decoded_inst[1] == 'HL':
+                    return ['write_byte(' + HL_SOURCE + ', ' + source + ')']
+                return [REGISTER_SOURCE[decoded_inst[1]] + ' = ' + source]
+            case 'LD16':
+                value = operands[1] << 8 | operands[0]
+                if decoded_inst[1] == 'SP':
+                    return ['cpu.stack_pointer = ' + hex(value)]
+                most, least = REGISTER_PAIRS[decoded_inst[1]]
+                return [most + ' = ' + hex(operands[1]), least + ' = ' + hex(operands[0])]
+            case 'LDP':
+                return self.emit_pointer_load(decoded_inst[1], decoded_inst[2], operands)
+            case 'INC' | 'DEC':
+                if decoded_inst[1] == 'HL':
+                    return None
+                register = REGISTER_SOURCE[decoded_inst[1]]
+                table = 'INC_TABLE' if base_inst == 'INC' else 'DEC_TABLE'
+                return ['t = ' + table + '[' + register + ']',
+                        register + ' = t >> 8',
+                        'f[6] = (f[6] & 0x10) | (t & 0xFF)']
+            case 'INC16' | 'DEC16':
+                step = ' + 1' if base_inst == 'INC16' else ' - 1'
+                if decoded_inst[1] == 'SP':
+                    return ['cpu.stack_pointer = (cpu.stack_pointer' + step + ') & 0xFFFF']
+                most, least = REGISTER_PAIRS[decoded_inst[1]]
+                return ['v = ((' + most + ' << 8 | ' + least + ')' + step + ') & 0xFFFF',
+                        most + ' = v >> 8',
+                        least + ' = v & 0xFF']
+            case 'AND' | 'OR' | 'XOR':
+                operator = {'AND': ' & ', 'OR': ' | ', 'XOR': ' ^ '}[base_inst]
+                half_carry = '0x20' if base_inst == 'AND' else '0x00'
+                return ['t = (f[7]' + operator + self.u8_source(decoded_inst[1], operands) + ') & 0xFF',
+                        'f[7] = t',
+                        'f[6] = ' + half_carry + ' | (0x00 if t else 0x80)']
+            case 'CP':
+                return ['f[6] = SUB_TABLE[f[7] << 8 | ' + self.u8_source(decoded_inst[1], operands) + '] & 0xFF']
+            case 'ADD' | 'ADDC' | 'SUB' | 'SUBC':
+                ## Same (carry << 16) | (a << 8) | operand indexing as CPU_V2.add_u8 / sub_u8
+                table = 'ADD_TABLE[' if base_inst in ('ADD', 'ADDC') else 'SUB_TABLE['
+                carry = '(f[6] & 0x10) << 12 | ' if base_inst in ('ADDC', 'SUBC') else ''
+                return ['t = ' + table + carry + 'f[7] << 8 | ' + self.u8_source(decoded_inst[1], operands) + ']',
+                        'f[7] = t >> 8',
+                        'f[6] = t & 0xFF']
+        return None
+
+    def emit_pointer_load(self, to_register, from_register, operands):
+        if to_register == 'A':
+            match from_register:
+                case 'D16':
+                    return ['f[7] = read_byte(' + hex(operands[1] << 8 | operands[0]) + ')']
+                case 'HLI' | 'HLD':
+                    return ['v = ' + HL_SOURCE,
+                            'f[7] = read_byte(v)'] + self.emit_hl_step(from_register)
+                case _:
+                    most, least = REGISTER_PAIRS[from_register]
+                    return ['f[7] = read_byte(' + most + ' << 8 | ' + least + ')']
+
+        match to_register:
+            case 'D16':
+                return ['write_byte(' + hex(operands[1] << 8 | operands[0]) + ', f[7])']
+            case 'HLI' | 'HLD':
+                return ['v = ' + HL_SOURCE,
+                        'write_byte(v, f[7])'] + self.emit_hl_step(to_register)
+            case _:
+                most, least = REGISTER_PAIRS[to_register]
+                return ['write_byte(' + most + ' << 8 | ' + least + ', f[7])']
+
+    def emit_hl_step(self, operand_def):
+        ## Mirrors CPU_V2.post_increment_hl / post_decrement_hl
+        step = '(v + 1) & 0xFFFF' if operand_def == 'HLI' else '(v - 1) & 0xFFFF'
+        return ['v = ' + step,
+                'f[4] = v >> 8',
+                'f[5] = v & 0xFF']
@@ -2,7 +2,6 @@ from emulator.core.calculator import *
 from emulator.core.cartridge import *
 from emulator.periferials.serial import *
 from emulator.periferials.joypad import *
-import array as arr
 
 VBLANK_VECTOR = 0x40
 TIMER_VECTOR = 0x50
@@ -40,6 +39,7 @@ VRAM_BEGIN = 0x8000
 VRAM_END = 0x9fff
 OAM_BEGIN = 0xfe00
 OAM_END = 0xfe9f
+OAM_SIZE = 0xa0
 
 TIMER_DIV = 0xFF04
 TIMER_COUNTER = 0xFF05
@@ -47,117 +47,299 @@ TIMER_MODULO = 0xFF06
 TIMER_CONTROL = 0xFF07
 
 LCD_CONTROL = 0xFF40
+LCD_STAT = 0xFF41
+LCD_Y = 0xFF44
+LCD_REGISTERS_END = 0xFF4B
 JOYPAD = 0xFF00
 DMA = 0xFF46
 
 SB = 0xFF01
 SC = 0xFF02
 
+## Executable RAM is tracked in 64 byte pages, so HRAM code does not share a page with the IO registers
+CODE_PAGE_SHIFT = 6
+CODE_PAGES = (0xFFFF >> CODE_PAGE_SHIFT) + 1
+
+## The address space is mapped in 256 byte pages, each one either a backing buffer plus an offset or a handler
+PAGE_SHIFT = 8
+PAGES = (0xFFFF >> PAGE_SHIFT) + 1
+CODE_PAGES_PER_PAGE = 1 << (PAGE_SHIFT - CODE_PAGE_SHIFT)
+
+ROM_BANK_0_PAGES = range(0x00, 0x40)
+ROM_BANK_N_PAGES = range(0x40, 0x80)
+VRAM_PAGES = range(0x80, 0xA0)
+EXTERNAL_RAM_PAGES = range(0xA0, 0xC0)
+WORKING_RAM_PAGES = range(0xC0, 0xFE)
+OAM_PAGE = 0xFE
+IO_PAGE = 0xFF
+
+## IO page hooks are indexed by the low byte of the address, 0x00-0x7F are the registers and 0xFF is IE
+IO_HOOKS = 0x100
+
 
 class MemoryBus:
     calculator = Calculator()
-    memory = arr.array('I', [0x00] * (0xFFFF +1))
     allow_write_vram = True
     cartridge:Cartridge = None
+    timer = None
+    video_access_handler = None
+    vram_write_handler = None
+    ## IE & IF, kept up to date by every write to either register so the CPU checks one attribute per step
+    pending_interrupts = 0
 
     def __init__(self, joypad:Joypad, serial_port:SimpleNetworkAdapter):
         self.joypad = joypad
         self.serial_port = serial_port
         self.serial_port.register_incoming_handler(self.wire_incoming_serial)
+        ## One byte per address and one copy per bus, every write into it is already masked to 8 bits
+        self.memory = bytearray(0xFFFF + 1)
+        self.code_pages = bytearray(CODE_PAGES)
+        self.code_invalidation_handler = None
+
+        self.read_pages = [None] * PAGES
+        self.read_offsets = [0] * PAGES
+        self.read_handlers = [None] * PAGES
+        self.write_pages = [None] * PAGES
+        self.write_offsets = [0] * PAGES
+        self.write_handlers = [None] * PAGES
+        self.map_memory()
+
+        ## Only the registers with side effects get a hook, every other IO and HRAM address is a plain load or store
+        self.io_read_hooks = [None] * IO_HOOKS
+        self.io_write_hooks = [None] * IO_HOOKS
+        self.register_io_read_hook(JOYPAD, self.read_joypad)
+        self.register_io_write_hook(SC, self.write_serial_control)
+        self.register_io_write_hook(DMA, self.write_dma)
+        self.register_io_write_hook(INTERRUPT_FLAG, self.write_interrupt_register)
+        self.register_io_write_hook(INTERRUPT_ENABLE_REGISTER, self.write_interrupt_register)
 
     def insert_cartridge(self, cartridge:Cartridge):
         self.cartridge = cartridge
+        self.map_cartridge()
 
     def read_byte(self, addr):
-        if addr >= 0 and addr <= ROM_BANK_N_END:
-            return self.cartridge.read_rom(addr)
-        
-        if addr >= EXTERNAL_RAM_BEGIN and addr <= EXTERNAL_RAM_END:
-            return self.cartridge.read_ram(addr)
-
-        if addr == JOYPAD:
-            return self.wire_joypad()
-        
-        return self.memory[addr]
+        page = addr >> PAGE_SHIFT
+        buffer = self.read_pages[page]
+        if buffer is None:
+            return self.read_handlers[page](addr)
+        return buffer[addr + self.read_offsets[page]]
     
     def write_byte(self, addr, value):
-        if addr >= 0x8000:
-            if(addr == TIMER_DIV) :
-                self.memory[addr] = 0x00
-                return
-
-            if addr >= EXTERNAL_RAM_BEGIN and addr <= EXTERNAL_RAM_END:
-                self.cartridge.write_ram(addr, value)
-                return
-            
-            if addr == DMA:
-                self.dma(value)
-
-            if addr == SC and (value == 0x81 or value == 0x80):
-                self.wire_outcome_serial(value)
-            
-            self.memory[addr] = value & 0xFF
+        page = addr >> PAGE_SHIFT
+        buffer = self.write_pages[page]
+        if buffer is None:
+            self.write_handlers[page](addr, value)
             return
+        buffer[addr + self.write_offsets[page]] = value & 0xFF
+
+    def map_page(self, page, read_buffer, read_offset, read_handler, write_buffer, write_offset, write_handler):
+        self.read_pages[page] = read_buffer
+        self.read_offsets[page] = read_offset
+        self.read_handlers[page] = read_handler
+        self.write_pages[page] = write_buffer
+        self.write_offsets[page] = write_offset
+        self.write_handlers[page] = write_handler
+
+    def map_memory(self):
+        for page in ROM_BANK_0_PAGES:
+            self.map_page(page, None, 0, self.read_cartridge_rom, None, 0, self.write_cartridge_register)
+        for page in ROM_BANK_N_PAGES:
+            self.map_page(page, None, 0, self.read_cartridge_rom, None, 0, self.write_cartridge_register)
+        ## VRAM and OAM writes go through the handler so the PPU can catch up first
+        for page in VRAM_PAGES:
+            self.map_page(page, self.memory, 0, None, None, 0, self.write_video_memory)
+        for page in EXTERNAL_RAM_PAGES:
+            self.map_page(page, None, 0, self.read_cartridge_ram, None, 0, self.write_cartridge_ram)
+        for page in WORKING_RAM_PAGES:
+            self.map_page(page, self.memory, 0, None, self.memory, 0, self.write_memory)
+        self.map_page(OAM_PAGE, self.memory, 0, None, None, 0, self.write_video_memory)
+        self.map_page(IO_PAGE, None, 0, self.read_io, None, 0, self.write_io)
+
+    def map_cartridge(self):
+        self.map_rom_bank_0()
+        self.map_rom_bank_n()
+        self.map_external_ram()
+
+    ## Bank switching only swaps the memoryview window the pages point at, the offsets never change
+    def map_rom_bank_0(self):
+        rom_bank = self.cartridge.rom_bank_0
+        for page in ROM_BANK_0_PAGES:
+            self.read_pages[page] = rom_bank
+            self.read_offsets[page] = 0
+
+    def map_rom_bank_n(self):
+        rom_bank = self.cartridge.rom_bank
+        for page in ROM_BANK_N_PAGES:
+            self.read_pages[page] = rom_bank
+            self.read_offsets[page] = -ROM_BANK_N_BEGIN
+
+    ## RTC registers and cartridges without RAM stay on the handlers
+    def map_external_ram(self):
+        ram_bank = self.cartridge.get_ram_bank()
+        for page in EXTERNAL_RAM_PAGES:
+            self.read_pages[page] = ram_bank
+            self.read_offsets[page] = -EXTERNAL_RAM_BEGIN
+            self.write_pages[page] = ram_bank
+            self.write_offsets[page] = -EXTERNAL_RAM_BEGIN
+
+    def read_cartridge_rom(self, addr):
+        return self.cartridge.read_rom(addr)
+
+    def read_cartridge_ram(self, addr):
+        return self.cartridge.read_ram(addr)
+
+    def read_io(self, addr):
+        hook = self.io_read_hooks[addr & 0xFF]
+        if hook is not None:
+            return hook(addr)
+        return self.memory[addr]
+
+    def read_joypad(self, addr):
+        return self.wire_joypad()
+
+    ## LY and STAT are only brought up to date when the CPU looks at them
+    def read_video_register(self, addr):
+        self.video_access_handler(addr, False)
+        return self.memory[addr]
 
+    def write_cartridge_register(self, addr, value):
         if addr < 0x2000:
             return
 
         if addr < 0x4000:
             self.cartridge.select_rom(value)
+            self.map_rom_bank_n()
             return
         
         if addr < 0x6000:
             self.cartridge.select_ram(value)
+            self.map_external_ram()
             return 
 
-        if addr < 0x8000:
-            self.cartridge.select_extra(value)
+        self.cartridge.select_extra(value)
+        self.map_rom_bank_0()
+
+    def write_cartridge_ram(self, addr, value):
+        self.cartridge.write_ram(addr, value)
+
+    ## The PPU has to render every line up to now with the video state it had before this write
+    def write_video_memory(self, addr, value):
+        if self.video_access_handler is not None:
+            self.video_access_handler(addr, True)
+        self.memory[addr] = value & 0xFF
+        if addr <= VRAM_END and self.vram_write_handler is not None:
+            self.vram_write_handler(addr)
+
+    ## Only used for RAM pages holding compiled code, the others are written straight through the page table
+    def write_memory(self, addr, value):
+        if self.code_pages[addr >> CODE_PAGE_SHIFT]:
+            self.invalidate_code_page(addr >> CODE_PAGE_SHIFT)
+        self.memory[addr] = value & 0xFF
+
+    def write_io(self, addr, value):
+        hook = self.io_write_hooks[addr & 0xFF]
+        if hook is not None:
+            hook(addr, value)
             return
 
-    def inc_timer_div(self):
-        value = self.memory[TIMER_DIV]
-        value = value + 1
-        self.memory[TIMER_DIV] = value & 0xFF
+        if self.code_pages[addr >> CODE_PAGE_SHIFT]:
+            self.invalidate_code_page(addr >> CODE_PAGE_SHIFT)
+        self.memory[addr] = value & 0xFF
+
+    def write_video_register(self, addr, value):
+        self.video_access_handler(addr, True)
+        self.memory[addr] = value & 0xFF
+
+    def write_dma(self, addr, value):
+        if self.video_access_handler is not None:
+            self.video_access_handler(addr, True)
+        self.dma(value)
+        self.memory[addr] = value & 0xFF
+
+    def write_serial_control(self, addr, value):
+        if value == 0x81 or value == 0x80:
+            self.wire_outcome_serial(value)
+        self.memory[addr] = value & 0xFF
+
+    def write_interrupt_register(self, addr, value):
+        if self.code_pages[addr >> CODE_PAGE_SHIFT]:
+            self.invalidate_code_page(addr >> CODE_PAGE_SHIFT)
+        memory = self.memory
+        memory[addr] = value & 0xFF
+        self.pending_interrupts = memory[INTERRUPT_ENABLE_REGISTER] & memory[INTERRUPT_FLAG]
+
+    def register_io_read_hook(self, addr, hook):
+        self.io_read_hooks[addr & 0xFF] = hook
+
+    def register_io_write_hook(self, addr, hook):
+        self.io_write_hooks[addr & 0xFF] = hook
+
+    def register_timer(self, timer):
+        self.timer = timer
+        self.register_io_read_hook(TIMER_DIV, timer.read_register)
+        self.register_io_read_hook(TIMER_COUNTER, timer.read_register)
+        for addr in range(TIMER_DIV, TIMER_CONTROL + 1):
+            self.register_io_write_hook(addr, timer.write_register)
 
-    def inc_timer_counter(self):
-        value = self.memory[TIMER_COUNTER]
-        value = value + 1
+    def register_video_access_handler(self, handler):
+        self.video_access_handler = handler
+        self.register_io_read_hook(LCD_Y, self.read_video_register)
+        self.register_io_read_hook(LCD_STAT, self.read_video_register)
+        for addr in range(LCD_CONTROL, LCD_REGISTERS_END + 1):
+            self.register_io_write_hook(addr, self.write_video_register)
+        self.register_io_write_hook(DMA, self.write_dma)
 
-        if value > 0xFF:
-            self.request_timer_interrupt()
-            value = self.memory[TIMER_MODULO]
+    ## Told about every VRAM write once it is stored, so the PPU can refresh what it derived from that byte
+    def register_vram_write_handler(self, handler):
+        self.vram_write_handler = handler
 
-        self.memory[TIMER_COUNTER] = value
+    def register_code_invalidation_handler(self, handler):
+        self.code_invalidation_handler = handler
+
+    ## Writes to a page holding compiled code leave the page table for write_memory, which reports them
+    def watch_code_page(self, page):
+        self.code_pages[page] = 1
+        memory_page = page >> (PAGE_SHIFT - CODE_PAGE_SHIFT)
+        if self.write_pages[memory_page] is self.memory:
+            self.write_pages[memory_page] = None
+
+    def unwatch_code_page(self, page):
+        self.code_pages[page] = 0
+        memory_page = page >> (PAGE_SHIFT - CODE_PAGE_SHIFT)
+        first_code_page = memory_page * CODE_PAGES_PER_PAGE
+        if memory_page in WORKING_RAM_PAGES and not any(self.code_pages[first_code_page:first_code_page + CODE_PAGES_PER_PAGE]):
+            self.write_pages[memory_page] = self.memory
+
+    def invalidate_code_page(self, page):
+        self.unwatch_code_page(page)
+        self.code_invalidation_handler(page)
+
+    def request_interrupt(self, interrupt):
+        memory = self.memory
+        interrupt_request = memory[INTERRUPT_FLAG] | (1 << interrupt)
+        memory[INTERRUPT_FLAG] = interrupt_request
+        self.pending_interrupts = memory[INTERRUPT_ENABLE_REGISTER] & interrupt_request
 
     def request_timer_interrupt(self):
-        interrupt_request = self.memory[INTERRUPT_FLAG]
-        interrupt_request = self.calculator.set_bit(interrupt_request, 2)
-        self.memory[INTERRUPT_FLAG] = interrupt_request
+        self.request_interrupt(2)
 
     def request_stat_interrupt(self):
-        interrupt_request = self.memory[INTERRUPT_FLAG]
-        interrupt_request = self.calculator.set_bit(interrupt_request, 1)
-        self.memory[INTERRUPT_FLAG] = interrupt_request
+        self.request_interrupt(1)
 
     def request_vblank_interrupt(self):
-        interrupt_request = self.memory[INTERRUPT_FLAG]
-        interrupt_request = self.calculator.set_bit(interrupt_request, 0)
-        self.memory[INTERRUPT_FLAG] = interrupt_request
+        self.request_interrupt(0)
 
     def request_joypad_interrupt(self):
-        interrupt_request = self.memory[INTERRUPT_FLAG]
-        interrupt_request = self.calculator.set_bit(interrupt_request, 4)
-        self.memory[INTERRUPT_FLAG] = interrupt_request
+        self.request_interrupt(4)
 
     def request_serial_interrupt(self):
-        interrupt_request = self.memory[INTERRUPT_FLAG]
-        interrupt_request = self.calculator.set_bit(interrupt_request, 3)
-        self.memory[INTERRUPT_FLAG] = interrupt_request
+        self.request_interrupt(3)
 
     def clear_interruption_request(self, interrupt):
-        interrupt_request = self.memory[INTERRUPT_FLAG]
-        interrupt_request = self.calculator.reset_bit(interrupt_request, interrupt)
-        self.memory[INTERRUPT_FLAG] = interrupt_request
+        memory = self.memory
+        interrupt_request = memory[INTERRUPT_FLAG] & ~(1 << interrupt)
+        memory[INTERRUPT_FLAG] = interrupt_request
+        self.pending_interrupts = memory[INTERRUPT_ENABLE_REGISTER] & interrupt_request
 
     def wire_joypad(self):
         j_register = self.memory[JOYPAD]
@@ -183,11 +365,35 @@ class MemoryBus:
             self.memory[SC] = self.calculator.reset_bit(serial_control, 7)
             self.request_serial_interrupt()
         
+    ## The source page is resolved once and the 160 bytes land in OAM as one slice copy
     def dma(self, addr):
         base_addr = addr << 8
-        base_oam = OAM_BEGIN
-        read_byte = self.read_byte
-        for i in range (160):
-            self.memory[base_oam] = read_byte(base_addr)
-            base_addr += 1
-            base_oam += 1
+        buffer = self.read_pages[addr]
+        ## The whole source is one page, read straight through the page table rather than read_byte so DMA never trips CPU watchpoints
+        if buffer is None:
+            read_handler = self.read_handlers[addr]
+            self.memory[OAM_BEGIN:OAM_BEGIN + OAM_SIZE] = bytes(read_handler(base_addr + i) & 0xFF for i in range(OAM_SIZE))
+            return
+        if addr in EXTERNAL_RAM_PAGES:
+            offset = self.read_offsets[addr]
+            self.memory[OAM_BEGIN:OAM_BEGIN + OAM_SIZE] = bytes(buffer[base_addr + offset + i] & 0xFF for i in range(OAM_SIZE))
+            return
+
+        start = base_addr + self.read_offsets[addr]
+        self.memory[OAM_BEGIN:OAM_BEGIN + OAM_SIZE] = buffer[start:start + OAM_SIZE]
+
+    ## While a timed DMA is running the CPU reads 0xFF from OAM and its writes there are lost
+    def block_oam(self):
+        self.map_page(OAM_PAGE, None, 0, self.read_blocked_oam, None, 0, self.write_blocked_oam)
+
+    def unblock_oam(self):
+        self.map_page(OAM_PAGE, self.memory, 0, None, None, 0, self.write_video_memory)
+
+    def read_blocked_oam(self, addr):
+        if addr > OAM_END:
+            return self.memory[addr]
+        return 0xFF
+
+    def write_blocked_oam(self, addr, value):
+        if addr > OAM_END:
+            self.write_video_memory(addr, value)
\ No newline at end of file
@@ -1,3 +1,5 @@
+from emulator.core.basic_register import *
+
 class Calculator:
     overflow = False
     bit_map_lookup = {
@@ -145,3 +147,76 @@ class Calculator:
     
     def not_u8(self, a):
         return ~a & 0xFF
+
+
+## 8-bit ALU lookup tables, built once at import.
+## Every entry packs the result in the high byte and the F register in the low byte: (result << 8) | flags
+## ADD/SUB are indexed by (carry << 16) | (a << 8) | b, the shift group by (carry << 8) | operand
+
+def build_add_table():
+    table = [0] * 0x20000
+    for carry in range(2):
+        for a in range(256):
+            for b in range(256):
+                result = a + b + carry
+                flags = 0x00 if result & 0xFF else ZERO_FLAG
+                if (a & 0xF) + (b & 0xF) + carry > 0xF:
+                    flags |= HALF_CARRY_FLAG
+                if result > 0xFF:
+                    flags |= CARRY_FLAG
+                table[carry << 16 | a << 8 | b] = (result & 0xFF) << 8 | flags
+    return table
+
+def build_sub_table():
+    table = [0] * 0x20000
+    for carry in range(2):
+        for a in range(256):
+            for b in range(256):
+                result = a - b - carry
+                flags = NEGATIVE_FLAG if result & 0xFF else ZERO_FLAG | NEGATIVE_FLAG
+                if (a & 0xF) - (b & 0xF) - carry < 0:
+                    flags |= HALF_CARRY_FLAG
+                if result < 0:
+                    flags |= CARRY_FLAG
+                table[carry << 16 | a << 8 | b] = (result & 0xFF) << 8 | flags
+    return table
+
+## INC/DEC leave the carry untouched, so their entries never carry CARRY_FLAG
+def build_inc_table():
+    return [ADD_TABLE[operand << 8 | 1] & ~CARRY_FLAG for operand in range(256)]
+
+def build_dec_table():
+    return [SUB_TABLE[operand << 8 | 1] & ~CARRY_FLAG for operand in range(256)]
+
+def build_shift_table(operation, use_carry=False):
+    table = [0] * 0x200
+    alu = Calculator()
+    for carry in range(2):
+        for operand in range(256):
+            result = operation(alu, operand, carry) if use_carry else operation(alu, operand)
+            flags = 0x00 if result else ZERO_FLAG
+            if alu.overflow:
+                flags |= CARRY_FLAG
+            table[carry << 8 | operand] = result << 8 | flags
+    return table
+
+def build_swap_table():
+    table = []
+    for operand in range(256):
+        result = Calculator.swap_u8(None, operand)
+        table.append(result << 8 | (0x00 if result else ZERO_FLAG))
+    return table
+
+ADD_TABLE = build_add_table()
+SUB_TABLE = build_sub_table()
+INC_TABLE = build_inc_table()
+DEC_TABLE = build_dec_table()
+
+RL_TABLE = build_shift_table(Calculator.rotate_left, True)
+RLC_TABLE = build_shift_table(Calculator.rotate_left_carry)
+RR_TABLE = build_shift_table(Calculator.rotate_right, True)
+RRC_TABLE = build_shift_table(Calculator.rotate_right_carry)
+SLA_TABLE = build_shift_table(Calculator.shift_left_a)
+SRA_TABLE = build_shift_table(Calculator.shift_right_a)
+SRL_TABLE = build_shift_table(Calculator.shift_right_logical)
+SWAP_TABLE = build_swap_table()
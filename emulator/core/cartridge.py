@@ -11,6 +11,9 @@ class Cartridge:
 
     def __init__(self, game_rom, rom_name = 'default'):
         self.mbc = self.get_mbc(game_rom, rom_name)
+        ## memoryview windows over the ROM for 0x0000-0x3FFF and 0x4000-0x7FFF, the CPU fetches opcodes straight from them
+        self.rom_bank_0 = self.mbc.rom_bank_0
+        self.rom_bank = self.mbc.rom_bank
 
     def read_rom(self, addr):
         return self.mbc.read_rom(addr)
@@ -23,12 +26,19 @@ class Cartridge:
     
     def select_rom(self, bank):
         self.mbc.select_rom(bank)
+        self.rom_bank_offset = self.mbc.rom_bank_offset
+        self.rom_bank = self.mbc.rom_bank
 
     def select_ram(self, bank):
         self.mbc.select_ram(bank)
 
     def select_extra(self, value):
         self.mbc.select_extra(value)
+        self.rom_bank_0 = self.mbc.rom_bank_0
+
+    ## memoryview of the selected RAM bank for 0xA000-0xBFFF, None when it has to go through read_ram/write_ram
+    def get_ram_bank(self):
+        return self.mbc.get_ram_bank()
 
     def load_save(self):
         self.mbc.load_save()
@@ -68,10 +78,15 @@ class Cartridge:
     
 
 class MBC0:
+    rom_bank_offset = 0
+
     def __init__(self, game_rom, rom_name = 'default'):
         self.game_rom = game_rom
         self.rom_size = len(game_rom)
         self.rom_name = rom_name
+        rom_view = memoryview(game_rom)
+        self.rom_bank_0 = rom_view[0:BANK_ROM_BASE]
+        self.rom_bank = rom_view[BANK_ROM_BASE:2 * BANK_ROM_BASE]
 
     def read_rom(self, addr):
         return self.game_rom[addr]
@@ -91,6 +106,9 @@ class MBC0:
     def select_extra(self, value):
         pass
 
+    def get_ram_bank(self):
+        return None
+
     def load_save(self):
         pass
 
@@ -112,13 +130,16 @@ class MBC3:
         self._with_battery = with_battery
         self._with_rtc = with_rtc
         self.save_handler = FileSystemSaveHandler(self.RAM_SIZE, rom_name)
+        self.rom_view = memoryview(game_rom)
+        self.rom_bank_0 = self.rom_view[0:BANK_ROM_BASE]
+        self.select_rom(0)
         self.load_save()
 
     def read_rom(self, addr):
         if addr < 0x4000:
             return self.game_rom[addr]
         
-        return self.game_rom[addr + self.rom_bank_offset]
+        return self.rom_bank[addr - BANK_ROM_BASE]
 
     def read_ram(self, addr):
         if self.rtc_register != 0x00:
@@ -127,20 +148,22 @@ class MBC3:
         if not self._with_ram:
             return 0x00
         
-        return self.ext_ram[addr - 0xa000 + self.ram_bank_offset]
+        return self.ram_bank[addr - 0xa000]
     
     def write_ram(self, addr, value):
         if not self._with_ram:
             return
         
-        self.ext_ram[addr - 0xa000 + self.ram_bank_offset] = value & 0xFF
+        self.ram_bank[addr - 0xa000] = value & 0xFF
     
     def select_rom(self, bank):
         if bank == 0:
             self.rom_bank_offset = 0
-            return
-        
-        self.rom_bank_offset = (bank - 1) * BANK_ROM_BASE
+        else:
+            self.rom_bank_offset = (bank - 1) * BANK_ROM_BASE
+
+        bank_start = self.rom_bank_offset + BANK_ROM_BASE
+        self.rom_bank = self.rom_view[bank_start:bank_start + BANK_ROM_BASE]
 
     def select_ram(self, bank):
         if bank > 0x07 and self._with_rtc:
@@ -149,10 +172,16 @@ class MBC3:
         
         self.rtc_register = 0x00
         self.ram_bank_offset = bank * BANK_RAM_BASE
+        self.ram_bank = memoryview(self.ext_ram)[self.ram_bank_offset:self.ram_bank_offset + BANK_RAM_BASE]
 
     def select_extra(self, value):
         pass
 
+    def get_ram_bank(self):
+        if self.rtc_register != 0x00 or not self._with_ram:
+            return None
+        return self.ram_bank
+
     def rtc_decode(self):
         utc_time = time.time()
         if self.rtc_register == 0x08:
@@ -171,12 +200,14 @@ class MBC3:
             self.ext_ram = self.save_handler.load_save()
         else:
             self.ext_ram = arr.array('B', [0x00] * (self.RAM_SIZE))
+        self.ram_bank = memoryview(self.ext_ram)[self.ram_bank_offset:self.ram_bank_offset + BANK_RAM_BASE]
 
     def save_game(self):
         if self._with_battery:
             self.save_handler.save_game(self.ext_ram)
         else:
-            self.ext_ram = arr.array('B', [0x00] * (self.RAM_SIZE))
+            ## Cleared in place, the memory bus keeps a reference to the RAM bank
+            self.ext_ram[:] = arr.array('B', [0x00] * (self.RAM_SIZE))
 
 
 class MBC1:
@@ -195,58 +226,70 @@ class MBC1:
         self._with_ram = with_ram
         self._with_battery = with_battery 
         self.save_handler = FileSystemSaveHandler(self.RAM_SIZE, rom_name)
+        self.rom_view = memoryview(game_rom)
+        self.select_extra(0)
+        self.select_rom(0)
 
-        self.ext_ram = self.load_save()
+        self.load_save()
 
     def read_rom(self, addr):
-        if addr < 0x4000 and not self.banking_mode:
-            return self.game_rom[addr]
-        
-        if addr < 0x4000 and self.banking_mode:
-            return self.game_rom[addr + self.second_rom_bank * BANK_ROM_BASE]
+        if addr < 0x4000:
+            return self.rom_bank_0[addr]
         
-        return self.game_rom[addr + self.rom_bank_offset]
+        return self.rom_bank[addr - BANK_ROM_BASE]
 
     def read_ram(self, addr):
         if not self._with_ram:
             return 0x00
         
-        return self.ext_ram[addr - 0xa000 + self.ram_bank_offset]
+        return self.ram_bank[addr - 0xa000]
     
     def write_ram(self, addr, value):
         if not self._with_ram:
             return
         
-        self.ext_ram[addr - 0xa000 + self.ram_bank_offset] = value & 0xFF
+        self.ram_bank[addr - 0xa000] = value & 0xFF
     
     def select_rom(self, bank):
         bank = bank & 0x1F
         if bank == 0:
             self.rom_bank_offset = self.second_rom_bank | 0
-            return
-        
-        self.rom_bank_offset = ((self.second_rom_bank | bank) - 1) * BANK_ROM_BASE
+        else:
+            self.rom_bank_offset = ((self.second_rom_bank | bank) - 1) * BANK_ROM_BASE
+
+        bank_start = self.rom_bank_offset + BANK_ROM_BASE
+        self.rom_bank = self.rom_view[bank_start:bank_start + BANK_ROM_BASE]
 
     def select_ram(self, bank):
         if self.banking_mode == 0:
             self.ram_bank_offset = bank * BANK_RAM_BASE
+            self.ram_bank = memoryview(self.ext_ram)[self.ram_bank_offset:self.ram_bank_offset + BANK_RAM_BASE]
         else:
             self.second_rom_bank_offset = (bank & 0x11) << 5
 
     def select_extra(self, value):
         self.banking_mode = value & 0x1
+        bank_0_start = self.second_rom_bank * BANK_ROM_BASE if self.banking_mode else 0
+        self.rom_bank_0 = self.rom_view[bank_0_start:bank_0_start + BANK_ROM_BASE]
+
+    def get_ram_bank(self):
+        if not self._with_ram:
+            return None
+        return self.ram_bank
         
     def load_save(self):
         if self._with_battery:
             self.ext_ram = self.save_handler.load_save()
         else:
             self.ext_ram = arr.array('B', [0x00] * (self.RAM_SIZE))
+        self.ram_bank = memoryview(self.ext_ram)[self.ram_bank_offset:self.ram_bank_offset + BANK_RAM_BASE]
 
     def save_game(self):
         if self._with_battery:
             self.save_handler.save_game(self.ext_ram)
         else:
-            self.ext_ram = arr.array('B', [0x00] * (self.RAM_SIZE))
+            ## Cleared in place, the memory bus keeps a reference to the RAM bank
+            self.ext_ram[:] = arr.array('B', [0x00] * (self.RAM_SIZE))
 
 
 class FileSystemSaveHandler:
@@ -3,6 +3,10 @@ from emulator.core.instructions_dict import *
 from emulator.core.calculator import *
 from emulator.core.ppu import *
 from emulator.core.basic_register import *
+from emulator.core.block_compiler import *
+from functools import partial
+
+RST_VECTORS = [0x0 , 0x10 , 0x20 , 0x30 , 0x08 , 0x18 , 0x28 , 0x38]
 
 class CPU_V2:
     program_counter = 0x0100
@@ -10,16 +14,11 @@ class CPU_V2:
     interrupts_enabled = False
     is_halt = False
     clock_cycle = 0
+    run_cycles = 0
+    run_target = 0
 
-    registers = Registers()
     alu = Calculator()
 
-    def breakpoint(self):
-        break_address = []
-        if self.program_counter in break_address:
-            self.print_debug()
-            input('Continue....')
-
     def print_debug(self):
         print('BREAK POINT')
         print('Line: ', hex(self.program_counter))
@@ -32,6 +31,7 @@ class CPU_V2:
 
     def __init__(self, memory_bus:MemoryBus):
         self.memory_bus = memory_bus
+        self.registers = Registers()
         self.registers.set_af(0x01b0)
         self.registers.set_bc(0x0013)
         self.registers.set_de(0x00d8)
@@ -42,65 +42,90 @@ class CPU_V2:
         self.memory_bus.write_byte(LCD_CONTROL, 0x91)
         self.memory_bus.write_byte(LCD_STAT, 0x81)
 
-        self._base_inst_handler = {
-            'NOP': lambda x : 0,
-            'STOP': lambda x: 0,
-            'ADD': self.add_u8,
-            'ADDC': self.add_u8,
-            'JP': self.direct_jump,
-            'JPR': self.relative_jump,
-            'AND': self.and_u8,
-            'CALL': self.call,
-            'RET': self.ret,
-            'ADDHL': self.add_u16,
-            'ADDSP': self.add_signed_sp,
-            'CCF': self.complement_carry,
-            'CPL': self.complement_acc,
-            'CP': self.compare,
-            'DEC': self.decrement_u8,
-            'INC': self.increment_u8,
-            'DEC16': self.decrement_u16,
-            'INC16': self.increment_u16,
-            'DI': self.disable_interrupt,
-            'EI': self.enable_interrupt,
-            'RETI': self.reti,
-            'HALT': self.halt,
-            'LD': self.basic_load,
-            'LDP': self.pointer_load,
-            'LD16': self.load_16u,
-            'LDS': self.load_stack,
-            'LDH': self.load_high,
-            'OR': self.or_u8,
-            'POP': self.pop,
-            'PUSH': self.push,
-            'SUB': self.sub_u8,
-            'SUBC': self.sub_u8,
-            'XOR': self.xor_u8,
-            'RST': self.rst,
-            'RL': self.rotate_left,
-            'RLC': self.rotate_left_carry,
-            'RR': self.rotate_right,
-            'RRC': self.rotate_right_carry,
-            'RLCA': self.rotate_left_a_carry,
-            'RRCA': self.rotate_right_a_carry,
-            'RLA': self.rotate_left_a,
-            'RRA': self.rotate_right_a,
-            'SRL': self.shift_right_logical,
-            'SRA': self.shift_right_arithmacally,
-            'SLA': self.shift_left_arithmacally,
-            'SWAP': self.swap,
-            'DAA': self.decimal_adjust,
-            'BIT': self.bit,
-            'RES': self.reset,
-            'SET': self.set,
-            'SCF': self.set_carry_flag
+        self._base_inst_decoder = {
+            'NOP': lambda : self.no_operation,
+            'STOP': lambda : self.no_operation,
+            'ADD': lambda operand_def: partial(self.add_u8, self.u8_reader(operand_def), False),
+            'ADDC': lambda operand_def: partial(self.add_u8, self.u8_reader(operand_def), True),
+            'JP': self.decode_direct_jump,
+            'JPR': lambda operand_def: partial(self.relative_jump, self.condition_checker(operand_def), self.taken_cycles(operand_def, 1)),
+            'AND': lambda operand_def: partial(self.and_u8, self.u8_reader(operand_def)),
+            'CALL': lambda operand_def: partial(self.call, self.condition_checker(operand_def), self.taken_cycles(operand_def, 3)),
+            'RET': lambda operand_def: partial(self.ret, self.condition_checker(operand_def), self.taken_cycles(operand_def, 3)),
+            'ADDHL': lambda operand_def: partial(self.add_u16, self.u16_reader(operand_def)),
+            'ADDSP': lambda operand_def: self.add_signed_sp,
+            'CCF': lambda : self.complement_carry,
+            'CPL': lambda : self.complement_acc,
+            'CP': lambda operand_def: partial(self.compare, self.u8_reader(operand_def)),
+            'DEC': lambda operand_def: partial(self.decrement_u8, self.u8_reader(operand_def), self.u8_writer(operand_def)),
+            'INC': lambda operand_def: partial(self.increment_u8, self.u8_reader(operand_def), self.u8_writer(operand_def)),
+            'DEC16': lambda operand_def: partial(self.decrement_u16, self.u16_reader(operand_def), self.u16_writer(operand_def)),
+            'INC16': lambda operand_def: partial(self.increment_u16, self.u16_reader(operand_def), self.u16_writer(operand_def)),
+            'DI': lambda : self.disable_interrupt,
+            'EI': lambda : self.enable_interrupt,
+            'RETI': lambda : self.reti,
+            'HALT': lambda : self.halt,
+            'LD': lambda to_register, from_register: partial(self.basic_load, self.u8_reader(from_register), self.u8_writer(to_register)),
+            'LDP': lambda to_register, from_register: partial(self.pointer_load, self.pointer_reader(from_register), self.pointer_writer(to_register)),
+            'LD16': lambda to_register, from_register: partial(self.load_16u, self.u16_writer(to_register)),
+            'LDS': self.decode_load_stack,
+            'LDH': lambda to_register, from_register: partial(self.load_high, self.high_reader(from_register), self.high_writer(to_register)),
+            'OR': lambda operand_def: partial(self.or_u8, self.u8_reader(operand_def)),
+            'POP': lambda operand_def: partial(self.pop, self.u16_writer(operand_def)),
+            'PUSH': lambda operand_def: partial(self.push, self.u16_reader(operand_def)),
+            'SUB': lambda operand_def: partial(self.sub_u8, self.u8_reader(operand_def), False),
+            'SUBC': lambda operand_def: partial(self.sub_u8, self.u8_reader(operand_def), True),
+            'XOR': lambda operand_def: partial(self.xor_u8, self.u8_reader(operand_def)),
+            'RST': lambda operand_def: partial(self.rst, RST_VECTORS[int(operand_def)]),
+            'RL': lambda operand_def: self.decode_shift_rotation(operand_def, RL_TABLE),
+            'RLC': lambda operand_def: self.decode_shift_rotation(operand_def, RLC_TABLE),
+            'RR': lambda operand_def: self.decode_shift_rotation(operand_def, RR_TABLE),
+            'RRC': lambda operand_def: self.decode_shift_rotation(operand_def, RRC_TABLE),
+            'RLCA': lambda operand_def: self.decode_shift_rotation(operand_def, RLC_TABLE, True),
+            'RRCA': lambda operand_def: self.decode_shift_rotation(operand_def, RRC_TABLE, True),
+            'RLA': lambda operand_def: self.decode_shift_rotation(operand_def, RL_TABLE, True),
+            'RRA': lambda operand_def: self.decode_shift_rotation(operand_def, RR_TABLE, True),
+            'SRL': lambda operand_def: self.decode_shift_rotation(operand_def, SRL_TABLE),
+            'SRA': lambda operand_def: self.decode_shift_rotation(operand_def, SRA_TABLE),
+            'SLA': lambda operand_def: self.decode_shift_rotation(operand_def, SLA_TABLE),
+            'SWAP': lambda operand_def: partial(self.swap, self.u8_reader(operand_def), self.u8_writer(operand_def)),
+            'DAA': lambda : self.decimal_adjust,
+            'BIT': lambda operand_def, bit_def: partial(self.bit, self.u8_reader(operand_def), int(bit_def)),
+            'RES': lambda operand_def, bit_def: partial(self.set_reset, self.u8_reader(operand_def), self.u8_writer(operand_def), self.alu.reset_bit, int(bit_def)),
+            'SET': lambda operand_def, bit_def: partial(self.set_reset, self.u8_reader(operand_def), self.u8_writer(operand_def), self.alu.set_bit, int(bit_def)),
+            'SCF': lambda : self.set_carry_flag
         }
 
+        ## Every opcode is decoded once here, so the hot loop never touches the instruction names
+        self._instruction_table = self.decode_instruction_table(INSTRUCTION_DICT)
+        self._prefix_instruction_table = self.decode_instruction_table(PREFIX_INSTRUCTION_DICT)
+        self.block_compiler = BlockCompiler(self)
+        self.step = self.execute_step
+
+    def set_block_compiler(self, enabled):
+        self.step = self.execute_block if enabled else self.execute_step
+
+    ## Runs instructions back to back until target_cycles m-cycles have elapsed or the CPU halts.
+    ## Only the CPU moves here, the caller is responsible for the PPU and the timer.
+    ## run_cycles is kept on the instance so the scheduler can tell the current cycle mid-run, and run_target can be cut short by it
+    def run_until(self, target_cycles):
+        step = self.step
+        self.run_cycles = 0
+        self.run_target = target_cycles
+        while self.run_cycles < self.run_target:
+            self.run_cycles += step()
+            if self.is_halt:
+                break
+
+        cycles = self.run_cycles
+        self.run_cycles = 0
+        self.run_target = 0
+        return cycles
+
     def execute_step(self):
         self.clock_cycle = 0
-        pending = self.verify_pending_interrupt()
+        pending = self.memory_bus.pending_interrupts
 
-        ##self.breakpoint()
         if self.is_halt:
             if pending and self.interrupts_enabled:
                 self.is_halt = False
@@ -115,609 +140,432 @@ class CPU_V2:
             if self.interrupts_enabled and pending:
                 self.handle_interrupts(pending)
 
-            instruction = self.get_instruction()
-            self.instruction_router(instruction)
+            self.execute_instruction()
 
         return self.clock_cycle
 
-    def get_instruction(self):
-        instruction = self.memory_bus.read_byte(self.program_counter)
-        program_step = 1
-        instruction_definition = None
-        if instruction == 0xCB:
-            instruction = self.memory_bus.read_byte(self.program_counter + program_step)
-            program_step = program_step + 1
-            instruction_definition = PREFIX_INSTRUCTION_DICT.get(instruction, None)
+    ## Runs a whole compiled block, falling back to execute_step whenever the interpreter is needed
+    def execute_block(self):
+        if self.is_halt:
+            return self.execute_step()
+
+        if self.interrupts_enabled and self.memory_bus.pending_interrupts:
+            return self.execute_step()
+
+        block = self.block_compiler.get_block(self.program_counter)
+        if block is None:
+            return self.execute_step()
+
+        return block()
+
+    ## Fetches the next opcode and its immediate as a plain int (u16 immediates already little-endian decoded),
+    ## reading the cartridge ROM bank windows directly when the whole instruction sits inside one ROM bank
+    def execute_instruction(self):
+        pc = self.program_counter
+        cartridge = self.memory_bus.cartridge
+        if pc < ROM_BANK_0_END - 1:
+            rom = cartridge.rom_bank_0
+            address = pc
+        elif pc >= ROM_BANK_N_BEGIN and pc < ROM_BANK_N_END - 1:
+            rom = cartridge.rom_bank
+            address = pc - ROM_BANK_N_BEGIN
         else:
-            instruction_definition = INSTRUCTION_DICT.get(instruction, None)
-
-        operands = [0x00] * 2
-        if instruction_definition.operands_number > 0:
-            for i in range(instruction_definition.operands_number):
-                operands[i] = self.memory_bus.read_byte(self.program_counter + program_step)
-                program_step = program_step + 1
+            return self.execute_instruction_from_bus()
+
+        opcode = rom[address]
+        if opcode == 0xCB:
+            instruction_definition, handler = self._prefix_instruction_table[rom[address + 1]]
+            self.program_counter = pc + 2
+            self.clock_cycle += instruction_definition.cycles
+            return handler(0)
+
+        instruction_definition, handler = self._instruction_table[opcode]
+        operands_number = instruction_definition.operands_number
+        if operands_number == 0:
+            immediate = 0
+        elif operands_number == 1:
+            immediate = rom[address + 1]
+        else:
+            immediate = rom[address + 2] << 8 | rom[address + 1]
+
+        self.program_counter = pc + 1 + operands_number
+        self.clock_cycle += instruction_definition.cycles
+        handler(immediate)
+
+    def execute_instruction_from_bus(self):
+        read_byte = self.memory_bus.read_byte
+        pc = self.program_counter
+        opcode = read_byte(pc)
+        if opcode == 0xCB:
+            instruction_definition, handler = self._prefix_instruction_table[read_byte(pc + 1)]
+            self.program_counter = pc + 2
+            self.clock_cycle += instruction_definition.cycles
+            return handler(0)
+
+        instruction_definition, handler = self._instruction_table[opcode]
+        operands_number = instruction_definition.operands_number
+        if operands_number == 0:
+            immediate = 0
+        elif operands_number == 1:
+            immediate = read_byte(pc + 1)
+        else:
+            immediate = read_byte(pc + 2) << 8 | read_byte(pc + 1)
+
+        self.program_counter = pc + 1 + operands_number
+        self.clock_cycle += instruction_definition.cycles
+        handler(immediate)
+
+    def decode_instruction_table(self, instruction_dict):
+        table = [None] * 256
+        for opcode, instruction_definition in instruction_dict.items():
+            decoded_inst = instruction_definition.name.split('_')
+            decoder = self._base_inst_decoder[decoded_inst[0]]
+            table[opcode] = (instruction_definition, decoder(*decoded_inst[1:]))
+        return table
+
+    def decode_direct_jump(self, operand_def):
+        condition = self.condition_checker(operand_def)
+        if operand_def == 'HL':
+            get_hl = self.registers.get_hl
+            return partial(self.direct_jump, condition, 0, lambda immediate: get_hl())
+        return partial(self.direct_jump, condition, self.taken_cycles(operand_def, 1), lambda immediate: immediate)
+
+    def decode_load_stack(self, to_register, from_register):
+        match to_register:
+            case 'D16':
+                return self.store_stack_pointer
+            case 'SP':
+                return self.load_stack_from_hl
+            case 'HL':
+                return self.load_hl_from_stack
 
-        instruction = Instruction(instruction_definition, operands)
-        self.program_counter = self.program_counter + program_step
-        self.clock_cycle = self.clock_cycle + instruction.definition.cycles
+    def decode_shift_rotation(self, operand_def, table, accumulator_only=False):
+        handler = self.shift_rotation_a_operations if accumulator_only else self.shift_rotation_operations
+        return partial(handler, self.u8_reader(operand_def), self.u8_writer(operand_def), table)
 
-        return instruction
-    
-    def instruction_router(self, instruction:Instruction):
-        decoded_base = instruction.definition.name.split('_')[0]
-        base_handler = self._base_inst_handler.get(decoded_base)
-        base_handler(instruction)
-
-    def add_u8(self, instruction:Instruction):
-        decoded_inst = instruction.definition.name.split('_')
-        base_inst = decoded_inst[0]
-        operand_def = decoded_inst[1]
-
-        use_carry = True if base_inst == 'ADDC' else False
-        carry = 0x1 if use_carry & self.registers.carry else 0x0
-        operand = 0x00
+    def u8_reader(self, operand_def):
+        file = self.registers.file
         match operand_def:
             case 'HL':
-                operand = self.memory_bus.read_byte(self.registers.get_hl())
+                return lambda immediate: self.memory_bus.read_byte(file[REG_H] << 8 | file[REG_L])
             case 'D8':
-                operand = instruction.operands[0]
+                return lambda immediate: immediate
             case _:
-                operand = self.registers.get_8_from_id(operand_def)
+                index = REGISTER_INDEX[operand_def]
+                return lambda immediate: file[index]
 
-        acumulator = self.registers.get_a()
-        first_result = self.alu.add_u8(acumulator, operand)
-        first_carry = self.alu.overflow
-        first_half_carry = self.alu.verify_overflow(acumulator, operand, 3)
+    def u8_writer(self, operand_def):
+        file = self.registers.file
+        match operand_def:
+            case 'HL':
+                return lambda value: self.memory_bus.write_byte(file[REG_H] << 8 | file[REG_L], value)
+            case _:
+                return partial(file.__setitem__, REGISTER_INDEX[operand_def])
 
-        second_result = self.alu.add_u8(first_result, carry)
-        second_carry = self.alu.overflow
-        second_half_carry = self.alu.verify_overflow(first_result, carry, 3)
-    
-        self.registers.zero = True if second_result == 0 else False
-        self.registers.negative = False
-        self.registers.half_carry = first_half_carry | second_half_carry
-        self.registers.carry = first_carry | second_carry
+    def u16_reader(self, operand_def):
+        match operand_def:
+            case 'SP':
+                return self.get_stack_pointer
+            case _:
+                return getattr(self.registers, 'get_' + operand_def.lower())
 
-        self.registers.set_a(second_result)
+    def u16_writer(self, operand_def):
+        match operand_def:
+            case 'SP':
+                return self.set_stack_pointer
+            case _:
+                return getattr(self.registers, 'set_' + operand_def.lower())
 
-    def add_u16(self, instruction:Instruction):
-        decoded_inst = instruction.definition.name.split('_')
-        operand_def = decoded_inst[1]
+    def pointer_reader(self, operand_def):
+        file = self.registers.file
+        match operand_def:
+            case 'A':
+                return lambda immediate: file[REG_A]
+            case 'D16':
+                return lambda immediate: self.memory_bus.read_byte(immediate)
+            case 'HLI':
+                return lambda immediate: self.memory_bus.read_byte(self.post_increment_hl())
+            case 'HLD':
+                return lambda immediate: self.memory_bus.read_byte(self.post_decrement_hl())
+            case _:
+                get_16 = self.u16_reader(operand_def)
+                return lambda immediate: self.memory_bus.read_byte(get_16())
 
-        acumulator = self.registers.get_hl()
-        operand = 0x00
+    def pointer_writer(self, operand_def):
+        file = self.registers.file
         match operand_def:
-            case 'SP':
-                operand = self.stack_pointer
+            case 'A':
+                return lambda immediate, value: file.__setitem__(REG_A, value)
+            case 'D16':
+                return lambda immediate, value: self.memory_bus.write_byte(immediate, value)
+            case 'HLI':
+                return lambda immediate, value: self.memory_bus.write_byte(self.post_increment_hl(), value)
+            case 'HLD':
+                return lambda immediate, value: self.memory_bus.write_byte(self.post_decrement_hl(), value)
             case _:
-                operand = self.registers.get_16_from_id(operand_def)
+                get_16 = self.u16_reader(operand_def)
+                return lambda immediate, value: self.memory_bus.write_byte(get_16(), value)
 
-        result = self.alu.add_u16(acumulator, operand)
+    def high_reader(self, operand_def):
+        file = self.registers.file
+        match operand_def:
+            case 'A':
+                return lambda immediate: file[REG_A]
+            case 'C':
+                return lambda immediate: self.memory_bus.read_byte(0xFF00 + file[REG_C])
+            case 'D8':
+                return lambda immediate: self.memory_bus.read_byte(0xFF00 + immediate)
 
-        self.registers.negative = False
-        self.registers.half_carry = self.alu.verify_overflow(acumulator, operand, 11)
-        self.registers.carry = self.alu.overflow
+    def high_writer(self, operand_def):
+        file = self.registers.file
+        match operand_def:
+            case 'A':
+                return lambda immediate, value: file.__setitem__(REG_A, value)
+            case 'C':
+                return lambda immediate, value: self.memory_bus.write_byte(0xFF00 + file[REG_C], value)
+            case 'D8':
+                return lambda immediate, value: self.memory_bus.write_byte(0xFF00 + immediate, value)
 
-        self.registers.set_hl(result)
+    def condition_checker(self, operand_def):
+        file = self.registers.file
+        match operand_def:
+            case 'NZ':
+                return lambda : not file[REG_F] & ZERO_FLAG
+            case 'NC':
+                return lambda : not file[REG_F] & CARRY_FLAG
+            case 'Z':
+                return lambda : file[REG_F] & ZERO_FLAG
+            case 'C':
+                return lambda : file[REG_F] & CARRY_FLAG
+            case _:
+                return lambda : True
 
-    def add_signed_sp(self, instruction:Instruction):
-        acumulator = self.stack_pointer
-        operand = instruction.operands[0]
+    def taken_cycles(self, operand_def, conditional_cycles):
+        return 0 if operand_def in ('D16', 'HL') else conditional_cycles
 
-        result = self.alu.add_as_sig(acumulator, operand)
+    def get_stack_pointer(self):
+        return self.stack_pointer
 
-        self.registers.zero = False
-        self.registers.negative = False
-        self.registers.half_carry = self.alu.verify_overflow(acumulator, operand, 3)
-        self.registers.carry = self.alu.verify_overflow(acumulator, operand, 7)
+    def set_stack_pointer(self, value):
+        self.stack_pointer = value
 
-        self.stack_pointer = result
+    def post_increment_hl(self):
+        file = self.registers.file
+        addr = file[REG_H] << 8 | file[REG_L]
+        self.registers.set_hl((addr + 1) & 0xFFFF)
+        return addr
 
-    def and_u8(self, instruction:Instruction):
-        decoded_inst = instruction.definition.name.split('_')
-        operand_def = decoded_inst[1]
+    def post_decrement_hl(self):
+        file = self.registers.file
+        addr = file[REG_H] << 8 | file[REG_L]
+        self.registers.set_hl((addr - 1) & 0xFFFF)
+        return addr
 
-        match operand_def:
-            case 'HL':
-                operand = self.memory_bus.read_byte(self.registers.get_hl())
-            case 'D8':
-                operand = instruction.operands[0]
-            case _:
-                operand = self.registers.get_8_from_id(operand_def)
-        
-        acumulator = self.registers.get_a()
-        result = self.alu.and_u8(acumulator, operand)
+    def no_operation(self, immediate):
+        pass
 
-        self.registers.zero = True if result == 0 else False
-        self.registers.negative = False
-        self.registers.half_carry = True
-        self.registers.carry = False
+    ## ADD_TABLE and SUB_TABLE are indexed by (carry << 16) | (a << 8) | operand, CARRY_FLAG << 12 lands the carry on bit 16
+    def add_u8(self, read_operand, use_carry, immediate):
+        file = self.registers.file
+        carry = (file[REG_F] & CARRY_FLAG) << 12 if use_carry else 0x0
+        entry = ADD_TABLE[carry | file[REG_A] << 8 | read_operand(immediate)]
 
-        self.registers.set_a(result)
+        file[REG_F] = entry & 0xFF
+        file[REG_A] = entry >> 8
 
-    def or_u8(self, instruction:Instruction):
-        decoded_inst = instruction.definition.name.split('_')
-        operand_def = decoded_inst[1]
+    def add_u16(self, read_operand, immediate):
+        file = self.registers.file
+        acumulator = file[REG_H] << 8 | file[REG_L]
+        operand = read_operand()
 
-        match operand_def:
-            case 'HL':
-                operand = self.memory_bus.read_byte(self.registers.get_hl())
-            case 'D8':
-                operand = instruction.operands[0]
-            case _:
-                operand = self.registers.get_8_from_id(operand_def)
-        
-        acumulator = self.registers.get_a()
-        result = self.alu.or_u8(acumulator, operand)
+        result = acumulator + operand
 
-        self.registers.zero = True if result == 0 else False
-        self.registers.negative = False
-        self.registers.half_carry = False
-        self.registers.carry = False
+        half_carry = (acumulator & 0xFFF) + (operand & 0xFFF) > 0xFFF
+        file[REG_F] = (file[REG_F] & ZERO_FLAG) | pack_flags(False, False, half_carry, result > 0xFFFF)
 
-        self.registers.set_a(result)
+        self.registers.set_hl(result & 0xFFFF)
 
-    def xor_u8(self, instruction:Instruction):
-        decoded_inst = instruction.definition.name.split('_')
-        operand_def = decoded_inst[1]
+    def add_signed_sp(self, immediate):
+        acumulator = self.stack_pointer
+        operand = immediate
 
-        match operand_def:
-            case 'HL':
-                operand = self.memory_bus.read_byte(self.registers.get_hl())
-            case 'D8':
-                operand = instruction.operands[0]
-            case _:
-                operand = self.registers.get_8_from_id(operand_def)
-        
-        acumulator = self.registers.get_a()
-        result = self.alu.xor_u8(acumulator, operand)
+        result = self.alu.add_as_sig(acumulator, operand)
 
-        self.registers.zero = True if result == 0 else False
-        self.registers.negative = False
-        self.registers.half_carry = False
-        self.registers.carry = False
+        half_carry = self.alu.verify_overflow(acumulator, operand, 3)
+        carry = self.alu.verify_overflow(acumulator, operand, 7)
+        self.registers.file[REG_F] = pack_flags(False, False, half_carry, carry)
 
-        self.registers.set_a(result)
+        self.stack_pointer = result
 
-    def sub_u8(self, instruction:Instruction):
-        decoded_inst = instruction.definition.name.split('_')
-        base_inst = decoded_inst[0]
-        operand_def = decoded_inst[1]
+    def and_u8(self, read_operand, immediate):
+        file = self.registers.file
+        operand = read_operand(immediate)
+        
+        result = file[REG_A] & operand
 
-        use_carry = True if base_inst == 'SUBC' else False
-        carry = 0x1 if use_carry & self.registers.carry else 0x0
-        operand = 0x00
+        file[REG_F] = HALF_CARRY_FLAG if result else ZERO_FLAG | HALF_CARRY_FLAG
+        file[REG_A] = result
 
-        match operand_def:
-            case 'HL':
-                operand = self.memory_bus.read_byte(self.registers.get_hl())
-            case 'D8':
-                operand = instruction.operands[0]
-            case _:
-                operand = self.registers.get_8_from_id(operand_def)
+    def or_u8(self, read_operand, immediate):
+        file = self.registers.file
+        operand = read_operand(immediate)
+        
+        result = file[REG_A] | operand
+
+        file[REG_F] = 0x00 if result else ZERO_FLAG
+        file[REG_A] = result
+
+    def xor_u8(self, read_operand, immediate):
+        file = self.registers.file
+        operand = read_operand(immediate)
+        
+        result = file[REG_A] ^ operand
 
-        first_result = self.alu.sub_u8(self.registers.get_a(), operand)
-        first_carry = self.alu.overflow
-        first_half = self.alu.verify_borrow(self.registers.get_a(), operand, 3)
+        file[REG_F] = 0x00 if result else ZERO_FLAG
+        file[REG_A] = result
 
-        second_result = self.alu.sub_u8(first_result, carry)
-        second_carry = self.alu.overflow
-        second_half = self.alu.verify_borrow(first_result, carry, 3)
+    def sub_u8(self, read_operand, use_carry, immediate):
+        file = self.registers.file
+        carry = (file[REG_F] & CARRY_FLAG) << 12 if use_carry else 0x0
+        entry = SUB_TABLE[carry | file[REG_A] << 8 | read_operand(immediate)]
 
-        self.registers.zero = True if second_result == 0 else False
-        self.registers.negative = True
-        self.registers.half_carry = first_half | second_half
-        self.registers.carry = first_carry | second_carry
-        self.registers.set_a(second_result)
+        file[REG_F] = entry & 0xFF
+        file[REG_A] = entry >> 8
 
-    def decimal_adjust(self, instruction:Instruction):
+    def decimal_adjust(self, immediate):
+        file = self.registers.file
+        flags = file[REG_F]
+        a = file[REG_A]
         new_carry = False
-        if self.registers.negative:
+        if flags & NEGATIVE_FLAG:
             adjust = 0x00
-            if self.registers.half_carry:
+            if flags & HALF_CARRY_FLAG:
                 adjust = self.alu.add_u8(adjust, 0x6)
-            if self.registers.carry:
+            if flags & CARRY_FLAG:
                 adjust = self.alu.add_u8(adjust, 0x60)
                 new_carry = True
-            result = self.alu.sub_u8(self.registers.get_a(), adjust)
+            result = self.alu.sub_u8(a, adjust)
         else:
-            a = self.registers.get_a()
             adjust = 0x00
-            if self.registers.half_carry or a & 0xf > 0x9:
+            if flags & HALF_CARRY_FLAG or a & 0xf > 0x9:
                 adjust = self.alu.add_u8(adjust, 0x6)
-            if self.registers.carry or a > 0x99:
+            if flags & CARRY_FLAG or a > 0x99:
                 adjust = self.alu.add_u8(adjust, 0x60)
                 new_carry = True
             result = self.alu.add_u8(a, adjust)
-        self.registers.set_a(result)
-        self.registers.zero = True if result == 0 else False
-        self.registers.half_carry = False
-        self.registers.carry = new_carry
+        file[REG_A] = result
+        file[REG_F] = (flags & NEGATIVE_FLAG) | pack_flags(result == 0, False, False, new_carry)
 
 
-    def compare(self, instruction:Instruction):
-        decoded_inst = instruction.definition.name.split('_')
-        operand_def = decoded_inst[1]
+    def compare(self, read_operand, immediate):
+        file = self.registers.file
+        file[REG_F] = SUB_TABLE[file[REG_A] << 8 | read_operand(immediate)] & 0xFF
 
-        acumulator = self.registers.get_a()
-        operand = 0x00
-        match operand_def:
-            case 'HL':
-                operand = self.memory_bus.read_byte(self.registers.get_hl())
-            case 'D8':
-                operand = instruction.operands[0]
-            case _:
-                operand = self.registers.get_8_from_id(operand_def)
-
-        self.registers.zero = True if operand == acumulator else False
-        self.registers.negative = True
-        self.registers.half_carry = self.alu.verify_borrow(acumulator, operand, 3)
-        self.registers.carry = operand > acumulator
-
-    def decrement_u8(self, instruction:Instruction):
-        decoded_inst = instruction.definition.name.split('_')
-        operand_def = decoded_inst[1]
-
-        operand = 0x00
-        match operand_def:
-            case 'HL':
-                operand = self.memory_bus.read_byte(self.registers.get_hl())
-            case _:
-                operand = self.registers.get_8_from_id(operand_def)
-
-        result = self.alu.sub_u8(operand, 1)
-        self.registers.zero = True if result == 0 else False
-        self.registers.negative = True
-        self.registers.half_carry = self.alu.verify_borrow(operand, 1, 3)
-
-        match operand_def:
-            case 'HL':
-                self.memory_bus.write_byte(self.registers.get_hl(), result)
-            case _:
-                self.registers.set_8_from_id(operand_def, result)
+    def decrement_u8(self, read_operand, write_result, immediate):
+        file = self.registers.file
+        entry = DEC_TABLE[read_operand(immediate)]
 
-    def increment_u8(self, instruction:Instruction):
-        decoded_inst = instruction.definition.name.split('_')
-        operand_def = decoded_inst[1]
+        file[REG_F] = (file[REG_F] & CARRY_FLAG) | (entry & 0xFF)
+        write_result(entry >> 8)
 
-        operand = 0x00
-        match operand_def:
-            case 'HL':
-                operand = self.memory_bus.read_byte(self.registers.get_hl())
-            case _:
-                operand = self.registers.get_8_from_id(operand_def)
-
-        result = self.alu.add_u8(operand, 1)
-        self.registers.zero = True if result == 0 else False
-        self.registers.negative = False
-        self.registers.half_carry = self.alu.verify_overflow(operand, 1, 3)
+    def increment_u8(self, read_operand, write_result, immediate):
+        file = self.registers.file
+        entry = INC_TABLE[read_operand(immediate)]
 
-        match operand_def:
-            case 'HL':
-                self.memory_bus.write_byte(self.registers.get_hl(), result)
-            case _:
-                self.registers.set_8_from_id(operand_def, result)
+        file[REG_F] = (file[REG_F] & CARRY_FLAG) | (entry & 0xFF)
+        write_result(entry >> 8)
     
-    def decrement_u16(self, instruction:Instruction):
-        decoded_inst = instruction.definition.name.split('_')
-        operand_def = decoded_inst[1]
-
-        operand = 0x0000
-        match operand_def:
-            case 'SP':
-                operand = self.stack_pointer
-            case _:
-                operand = self.registers.get_16_from_id(operand_def)
-        result = self.alu.sub_u16(operand, 1)
-        match operand_def:
-            case 'SP':
-                self.stack_pointer = result
-            case _:
-                self.registers.set_16_from_id(operand_def, result)
+    def decrement_u16(self, read_operand, write_result, immediate):
+        write_result((read_operand() - 1) & 0xFFFF)
 
-    def increment_u16(self, instruction:Instruction):
-        decoded_inst = instruction.definition.name.split('_')
-        operand_def = decoded_inst[1]
+    def increment_u16(self, read_operand, write_result, immediate):
+        write_result((read_operand() + 1) & 0xFFFF)
 
-        operand = 0x0000
-        match operand_def:
-            case 'SP':
-                operand = self.stack_pointer
-            case _:
-                operand = self.registers.get_16_from_id(operand_def)
-        result = self.alu.add_u16(operand, 1)
-        match operand_def:
-            case 'SP':
-                self.stack_pointer = result
-            case _:
-                self.registers.set_16_from_id(operand_def, result)
 
+    def direct_jump(self, condition, taken_cycles, read_address, immediate):
+        if condition():
+            self.program_counter = read_address(immediate)
+            self.clock_cycle += taken_cycles
 
-    def direct_jump(self, instruction:Instruction):
-        decoded_inst = instruction.definition.name.split('_')
-        operand_def = decoded_inst[1]
-        
-        jump_addr = 0x10000
-        match operand_def:
-            case 'HL':
-                jump_addr = self.registers.get_hl()
-            case 'D16':
-                jump_addr = self.build_u16_from_operands(instruction)
-            case 'NZ':
-                if not self.registers.zero:
-                    jump_addr = self.build_u16_from_operands(instruction)
-                    self.clock_cycle += 1
-            case 'NC':
-                if not self.registers.carry:
-                    jump_addr = self.build_u16_from_operands(instruction)
-                    self.clock_cycle += 1
-            case 'Z':
-                if self.registers.zero:
-                    jump_addr = self.build_u16_from_operands(instruction)
-                    self.clock_cycle += 1
-            case 'C':
-                if self.registers.carry:
-                    jump_addr = self.build_u16_from_operands(instruction)
-                    self.clock_cycle += 1
-
-        if jump_addr <= 0xFFFF:
-            self.program_counter = jump_addr
-
-    def relative_jump(self, instruction:Instruction):
-        decoded_inst = instruction.definition.name.split('_')
-        operand_def = decoded_inst[1]
-        
-        jump_addr = 0x10000
+    def relative_jump(self, condition, taken_cycles, immediate):
         actual_addr = self.program_counter
-        offset = instruction.operands[0]
+        offset = immediate
         next_addr = self.alu.add_as_sig(actual_addr, offset)
-        
-        match operand_def:
-            case 'D16':
-                jump_addr = next_addr
-            case 'NZ':
-                if not self.registers.zero:
-                    jump_addr = next_addr
-                    self.clock_cycle += 1
-            case 'NC':
-                if not self.registers.carry:
-                    jump_addr = next_addr
-                    self.clock_cycle += 1
-            case 'Z':
-                if self.registers.zero:
-                    jump_addr = next_addr
-                    self.clock_cycle += 1
-            case 'C':
-                if self.registers.carry:
-                    jump_addr = next_addr
-                    self.clock_cycle += 1
 
-        if jump_addr <= 0xFFFF:
-            self.program_counter = jump_addr
+        if condition():
+            self.program_counter = next_addr
+            self.clock_cycle += taken_cycles
 
-    def call(self, instruction:Instruction):
-        decoded_inst = instruction.definition.name.split('_')
-        operand_def = decoded_inst[1]
+    def call(self, condition, taken_cycles, immediate):
+        if condition():
+            self.call_address(immediate)
+            self.clock_cycle += taken_cycles
 
-        actual_addr = self.program_counter
-        candidate_addr = self.build_u16_from_operands(instruction)
-        jump_addr = 0x10000
-        match operand_def:
-            case 'D16':
-                self.push_to_stack(actual_addr)
-                jump_addr = candidate_addr
-            case 'NZ':
-                if not self.registers.zero:
-                    self.push_to_stack(actual_addr)
-                    jump_addr = candidate_addr
-                    self.clock_cycle += 3
-            case 'NC':
-                if not self.registers.carry:
-                    self.push_to_stack(actual_addr)
-                    jump_addr = candidate_addr
-                    self.clock_cycle += 3
-            case 'Z':
-                if self.registers.zero:
-                    self.push_to_stack(actual_addr)
-                    jump_addr = candidate_addr
-                    self.clock_cycle += 3
-            case 'C':
-                if self.registers.carry:
-                    self.push_to_stack(actual_addr)
-                    jump_addr = candidate_addr
-                    self.clock_cycle += 3
-
-        if jump_addr <= 0xFFFF:
-            self.program_counter = jump_addr
-
-    def ret(self, instruction:Instruction):
-        decoded_inst = instruction.definition.name.split('_')
-        operand_def = decoded_inst[1]
-
-        jump_addr = 0x10000
-        match operand_def:
-            case 'D16':
-                jump_addr = self.pop_from_stack()
-            case 'NZ':
-                if not self.registers.zero:
-                    jump_addr = self.pop_from_stack()
-                    self.clock_cycle += 3
-            case 'NC':
-                if not self.registers.carry:
-                    jump_addr = self.pop_from_stack()
-                    self.clock_cycle += 3
-            case 'Z':
-                if self.registers.zero:
-                    jump_addr = self.pop_from_stack()
-                    self.clock_cycle += 3
-            case 'C':
-                if self.registers.carry:
-                    jump_addr = self.pop_from_stack()
-                    self.clock_cycle += 3
-
-        if jump_addr <= 0xFFFF:
-            self.program_counter = jump_addr
-
-    def rst(self, instruction:Instruction):
-        vector = [0x0 , 0x10 , 0x20 , 0x30 , 0x08 , 0x18 , 0x28 , 0x38]
-        decoded_inst = instruction.definition.name.split('_')
-        operand_def = decoded_inst[1]
-
-        indirect_instruction = Instruction(INSTRUCTION_DICT.get(0xcd), [vector[int(operand_def)], 0])
-        self.call(indirect_instruction)
-
-    def complement_carry(self, instruction:Instruction):
-        self.registers.negative = False
-        self.registers.half_carry = False
-        self.registers.carry = not self.registers.carry
-
-    def complement_acc(self, instruction:Instruction):
-        self.registers.negative = True
-        self.registers.half_carry = True
-        
-        acumulator = self.registers.get_a()
-        result = self.alu.not_u8(acumulator)
-        self.registers.set_a(result)
+    def call_address(self, addr):
+        self.push_to_stack(self.program_counter)
+        self.program_counter = addr
 
-    def rotate_left_a(self, instruction:Instruction):
-        self.shift_rotation_operations(instruction, self.alu.rotate_left, True)
-        self.registers.zero = False
+    def ret(self, condition, taken_cycles, immediate):
+        if condition():
+            self.program_counter = self.pop_from_stack()
+            self.clock_cycle += taken_cycles
 
-    def rotate_left_a_carry(self, instruction:Instruction):
-        self.shift_rotation_operations(instruction, self.alu.rotate_left_carry)
-        self.registers.zero = False
+    def rst(self, vector, immediate):
+        self.call_address(vector)
 
-    def rotate_right_a(self, instruction:Instruction):
-        self.shift_rotation_operations(instruction, self.alu.rotate_right, True)
-        self.registers.zero = False
+    def complement_carry(self, immediate):
+        file = self.registers.file
+        file[REG_F] = (file[REG_F] & ZERO_FLAG) | (~file[REG_F] & CARRY_FLAG)
 
-    def rotate_right_a_carry(self, instruction:Instruction):
-        self.shift_rotation_operations(instruction, self.alu.rotate_right_carry)
-        self.registers.zero = False
+    def complement_acc(self, immediate):
+        file = self.registers.file
+        file[REG_F] = file[REG_F] | NEGATIVE_FLAG | HALF_CARRY_FLAG
+        file[REG_A] = self.alu.not_u8(file[REG_A])
 
-    def rotate_left(self, instruction:Instruction):
-        self.shift_rotation_operations(instruction, self.alu.rotate_left, True)
+    ## Shift tables are indexed by (carry << 8) | operand, CARRY_FLAG << 4 lands the carry on bit 8
+    def shift_rotation_a_operations(self, read_operand, write_result, table, immediate):
+        file = self.registers.file
+        entry = table[(file[REG_F] & CARRY_FLAG) << 4 | read_operand(immediate)]
+        write_result(entry >> 8)
 
-    def rotate_left_carry(self, instruction:Instruction):
-        self.shift_rotation_operations(instruction, self.alu.rotate_left_carry)
+        file[REG_F] = entry & CARRY_FLAG
 
-    def rotate_right(self, instruction:Instruction):
-        self.shift_rotation_operations(instruction, self.alu.rotate_right, True)
+    def shift_rotation_operations(self, read_operand, write_result, table, immediate):
+        file = self.registers.file
+        entry = table[(file[REG_F] & CARRY_FLAG) << 4 | read_operand(immediate)]
+        write_result(entry >> 8)
 
-    def rotate_right_carry(self, instruction:Instruction):
-        self.shift_rotation_operations(instruction, self.alu.rotate_right_carry)
+        file[REG_F] = entry & 0xFF
 
-    def shift_right_logical(self, instruction:Instruction):
-        self.shift_rotation_operations(instruction, self.alu.shift_right_logical)
-
-    def shift_right_arithmacally(self, instruction:Instruction):
-        self.shift_rotation_operations(instruction, self.alu.shift_right_a)
-
-    def shift_left_arithmacally(self, instruction:Instruction):
-        self.shift_rotation_operations(instruction, self.alu.shift_left_a)
-
-    def shift_rotation_operations(self, instruction:Instruction, alu_opr, use_carry=False):
-        decoded_inst = instruction.definition.name.split('_')
-        operand_def = decoded_inst[1]
-
-        carry = self.registers.carry * 1
-        new_carry = False
-        result = 0x00
-        match operand_def:
-            case 'HL':
-                operand = self.memory_bus.read_byte(self.registers.get_hl())
-                if use_carry:
-                    result = alu_opr(operand, carry)
-                else:
-                    result = alu_opr(operand)
-                new_carry = self.alu.overflow
-                self.memory_bus.write_byte(self.registers.get_hl(), result)
-            case _:
-                operand = self.registers.get_8_from_id(operand_def)
-                if use_carry:
-                    result = alu_opr(operand, carry)
-                else:
-                    result = alu_opr(operand)
-                new_carry = self.alu.overflow
-                self.registers.set_8_from_id(operand_def, result)
-
-        self.registers.zero = True if result == 0 else False
-        self.registers.negative = False
-        self.registers.half_carry = False
-        self.registers.carry = new_carry
-
-    def swap(self, instruction:Instruction):
-        decoded_inst = instruction.definition.name.split('_')
-        operand_def = decoded_inst[1]
-
-        result = 0x00
-        match operand_def:
-            case 'HL':
-                operand = self.memory_bus.read_byte(self.registers.get_hl())
-                result = self.alu.swap_u8(operand)
-                self.memory_bus.write_byte(self.registers.get_hl(), result)
-            case _:
-                operand = self.registers.get_8_from_id(operand_def)
-                result = self.alu.swap_u8(operand)
-                self.registers.set_8_from_id(operand_def, result)
+    def swap(self, read_operand, write_result, immediate):
+        entry = SWAP_TABLE[read_operand(immediate)]
+        write_result(entry >> 8)
         
-        self.registers.zero = True if result == 0 else False
-        self.registers.negative = False
-        self.registers.half_carry = False
-        self.registers.carry = False
-
-    def bit(self, instruction:Instruction):
-        decoded_inst = instruction.definition.name.split('_')
-        operand_def = decoded_inst[1]
-        bit_def = int(decoded_inst[2])
-
-        result = False
-        match operand_def:
-            case 'HL':
-                operand = self.memory_bus.read_byte(self.registers.get_hl())
-                result = self.alu.verify_bit(operand, bit_def)
-            case _:
-                operand = self.registers.get_8_from_id(operand_def)
-                result = self.alu.verify_bit(operand, bit_def)
-
-        self.registers.zero = not result
-        self.registers.negative = False
-        self.registers.half_carry = True
+        self.registers.file[REG_F] = entry & 0xFF
 
-    def reset(self, instruction:Instruction):
-        self.set_reset(instruction, self.alu.reset_bit)
+    def bit(self, read_operand, bit_def, immediate):
+        file = self.registers.file
+        operand = read_operand(immediate)
+        result = self.alu.verify_bit(operand, bit_def)
 
-    def set(self, instruction:Instruction):
-        self.set_reset(instruction, self.alu.set_bit)
+        file[REG_F] = (file[REG_F] & CARRY_FLAG) | HALF_CARRY_FLAG | (0x00 if result else ZERO_FLAG)
 
-    def set_reset(self, instruction:Instruction, bit_operation):
-        decoded_inst = instruction.definition.name.split('_')
-        operand_def = decoded_inst[1]
-        bit_def = int(decoded_inst[2])
+    def set_reset(self, read_operand, write_result, bit_operation, bit_def, immediate):
+        operand = read_operand(immediate)
+        result = bit_operation(operand, bit_def)
+        write_result(result)
 
-        result = 0x00
-        match operand_def:
-            case 'HL':
-                operand = self.memory_bus.read_byte(self.registers.get_hl())
-                result = bit_operation(operand, bit_def)
-                self.memory_bus.write_byte(self.registers.get_hl(), result)
-            case _:
-                operand = self.registers.get_8_from_id(operand_def)
-                result = bit_operation(operand, bit_def)
-                self.registers.set_8_from_id(operand_def, result)
+    def set_carry_flag(self, immediate):
+        file = self.registers.file
+        file[REG_F] = (file[REG_F] & ZERO_FLAG) | CARRY_FLAG
 
-    def set_carry_flag(self, Instruction: Instruction):
-        self.registers.negative = False
-        self.registers.half_carry = False
-        self.registers.carry = True
-
-    def disable_interrupt(self, instruction:Instruction):
+    def disable_interrupt(self, immediate):
         self.interrupts_enabled = False
 
-    def enable_interrupt(self, instruction:Instruction):
+    def enable_interrupt(self, immediate):
         self.interrupts_enabled = True
     
-    def halt(self, instruction:Instruction):
+    def halt(self, immediate):
         if self.interrupts_enabled:
             self.is_halt = True
         else:
@@ -726,147 +574,47 @@ class CPU_V2:
             else:
                 self.is_halt = True
 
-    def reti(self, instruction:Instruction):
-        self.enable_interrupt(instruction)
+    def reti(self, immediate):
+        self.enable_interrupt(immediate)
         jump_addr = self.pop_from_stack()
         self.program_counter = jump_addr
 
-    def basic_load(self, instruction:Instruction):
-        decoded_inst = instruction.definition.name.split('_')
-        from_register = decoded_inst[2]
-        to_register = decoded_inst[1]
+    def basic_load(self, read_value, write_value, immediate):
+        write_value(read_value(immediate))
 
-        value = 0x00
-        match from_register:
-            case 'HL':
-                value = self.memory_bus.read_byte(self.registers.get_hl())
-            case 'D8':
-                value = instruction.operands[0]
-            case _:
-                value = self.registers.get_8_from_id(from_register)
+    def pointer_load(self, read_value, write_value, immediate):
+        write_value(immediate, read_value(immediate))
 
-        match to_register:
-            case 'HL':
-                self.memory_bus.write_byte(self.registers.get_hl(), value)
-            case _:
-                self.registers.set_8_from_id(to_register, value)
+    def load_16u(self, write_value, immediate):
+        write_value(immediate)
 
-    def pointer_load(self, instruction:Instruction):
-        decoded_inst = instruction.definition.name.split('_')
-        from_register = decoded_inst[2]
-        to_register = decoded_inst[1]
+    def store_stack_pointer(self, immediate):
+        addr = immediate
+        value = self.stack_pointer
+        self.memory_bus.write_byte(addr, value & 0xFF)
+        self.memory_bus.write_byte(addr + 1, value >> 8)
 
-        value = 0x0
-        match from_register:
-            case 'A':
-                value = self.registers.get_a()
-            case 'D16':
-                addr = self.build_u16_from_operands(instruction)
-                value = self.memory_bus.read_byte(addr)
-            case 'HLI':
-                addr = self.registers.get_hl()
-                value = self.memory_bus.read_byte(addr)
-                self.registers.set_hl((addr + 1) & 0xFFFF)
-            case 'HLD':
-                addr = self.registers.get_hl()
-                value = self.memory_bus.read_byte(addr)
-                self.registers.set_hl(addr - 1)
-            case _:
-                value = self.memory_bus.read_byte(self.registers.get_16_from_id(from_register))
+    def load_stack_from_hl(self, immediate):
+        self.stack_pointer = self.registers.get_hl()
 
-        match to_register:
-            case 'A':
-                self.registers.set_a(value)
-            case 'D16':
-                addr = self.build_u16_from_operands(instruction)
-                self.memory_bus.write_byte(addr, value)
-            case 'HLI':
-                addr = self.registers.get_hl()
-                self.memory_bus.write_byte(addr, value)
-                self.registers.set_hl((addr + 1) & 0xFFFF)
-            case 'HLD':
-                addr = self.registers.get_hl()
-                self.memory_bus.write_byte(addr, value)
-                self.registers.set_hl(addr - 1)
-            case _:
-                self.memory_bus.write_byte(self.registers.get_16_from_id(to_register), value)
-
-    def load_16u(self, instruction:Instruction):
-        decoded_inst = instruction.definition.name.split('_')
-        to_register = decoded_inst[1]
-
-        value = self.build_u16_from_operands(instruction)
-        match to_register:
-            case 'SP':
-                self.stack_pointer = value
-            case _:
-                self.registers.set_16_from_id(to_register, value)
-
-    def load_stack(self, instruction:Instruction):
-        decoded_inst = instruction.definition.name.split('_')
-        to_register = decoded_inst[1]
-
-        value = 0x0
-        match to_register:
-            case 'D16':
-                addr = self.build_u16_from_operands(instruction)
-                value = self.stack_pointer
-                self.memory_bus.write_byte(addr, value & 0xFF)
-                self.memory_bus.write_byte(addr + 1, value >> 8)
-            case 'SP':
-                self.stack_pointer = self.registers.get_hl()
-            case 'HL':
-                a = self.stack_pointer
-                b = instruction.operands[0]
-                result = self.alu.add_as_sig(a, b)
-                self.registers.set_hl(result)
-                self.registers.zero = False
-                self.registers.negative = False
-                self.registers.half_carry = self.alu.verify_overflow(a, b, 3)
-                self.registers.carry = self.alu.verify_overflow(a, b, 7)
-
-    def load_high(self, instruction:Instruction):
-        decoded_inst = instruction.definition.name.split('_')
-        from_register = decoded_inst[2]
-        to_register = decoded_inst[1]
-
-        base_addr = 0xFF00
-        offset = 0x00
-        value = 0x00
-        match from_register:
-            case 'A':
-                value = self.registers.get_a()
-            case 'C':
-                offset = self.registers.get_c()
-                addr = offset + base_addr
-                value = self.memory_bus.read_byte(addr)
-            case 'D8':
-                offset = instruction.operands[0]
-                addr = offset + base_addr
-                value = self.memory_bus.read_byte(addr)
+    def load_hl_from_stack(self, immediate):
+        a = self.stack_pointer
+        b = immediate
+        result = self.alu.add_as_sig(a, b)
+        self.registers.set_hl(result)
+        half_carry = self.alu.verify_overflow(a, b, 3)
+        carry = self.alu.verify_overflow(a, b, 7)
+        self.registers.file[REG_F] = pack_flags(False, False, half_carry, carry)
 
-        match to_register:
-            case 'A':
-                self.registers.set_a(value)
-            case 'C':
-                offset = self.registers.get_c()
-                addr = offset + base_addr
-                self.memory_bus.write_byte(addr, value)
-            case 'D8':
-                offset = instruction.operands[0]
-                addr = offset + base_addr
-                self.memory_bus.write_byte(addr, value)
+    def load_high(self, read_value, write_value, immediate):
+        write_value(immediate, read_value(immediate))
 
-    def pop(self, instruction:Instruction):
-        decoded_inst = instruction.definition.name.split('_')
-        operand_def = decoded_inst[1]
+    def pop(self, write_value, immediate):
         value = self.pop_from_stack()
-        self.registers.set_16_from_id(operand_def, value)
+        write_value(value)
 
-    def push(self, instruction:Instruction):
-        decoded_inst = instruction.definition.name.split('_')
-        operand_def = decoded_inst[1]
-        value = self.registers.get_16_from_id(operand_def)
+    def push(self, read_value, immediate):
+        value = read_value()
         self.push_to_stack(value)
 
 
@@ -886,19 +634,14 @@ class CPU_V2:
         self.stack_pointer += 1
 
         return (most_s << 8) | least_s
-
-
-    def build_u16_from_operands(self, instruction:Instruction):
-        return instruction.operands[1] << 8 | instruction.operands[0]
     
     def handle_interrupts(self, pending_interrupts):
         interrupt_index = self.get_first_interrupt(pending_interrupts)
         self.is_halt = False
         self.interrupts_enabled = False
         self.clock_cycle += 5
-        indirect_instruction = Instruction(INSTRUCTION_DICT.get(0xcd), [INTERRUPT_VECTOR_MAP[interrupt_index], 0])
         self.memory_bus.clear_interruption_request(interrupt_index)
-        self.call(indirect_instruction)
+        self.call_address(INTERRUPT_VECTOR_MAP[interrupt_index])
     
     def get_first_interrupt(self, pending_interrupts):
         for i in range(5):
@@ -908,7 +651,5 @@ class CPU_V2:
             pending_interrupts = pending_interrupts >> 1
 
     def verify_pending_interrupt(self):
-        interrupt_enable = self.memory_bus.read_byte(INTERRUPT_ENABLE_REGISTER)
-        interrupt_flag = self.memory_bus.read_byte(INTERRUPT_FLAG)
-        return interrupt_enable & interrupt_flag
+        return self.memory_bus.pending_interrupts
         
@@ -0,0 +1,94 @@
+from emulator.core.motherboard import *
+
+## Breakpoints and watchpoints cost nothing until attach() is called: it swaps the CPU step for one that checks
+## the program counter and shadows the bus read_byte/write_byte with versions that check the watched addresses.
+## Only the CPU goes through those, the PPU keeps the original read_byte and DMA reads the page table, so only CPU accesses break.
+## Compiled blocks and idle loop skipping would jump over both, so they stay off while the debugger is attached
+class Debugger:
+    attached = False
+
+    def __init__(self, motherboard:Motherboard, break_handler=None):
+        self.motherboard = motherboard
+        self.cpu = motherboard.cpu
+        self.memory_bus = motherboard.memory_bus
+        ## Called with the reason of the break, by default it dumps the registers and waits for enter
+        self.break_handler = break_handler if break_handler is not None else self.pause
+
+        ## address -> condition, None breaks every time, otherwise condition(cpu) for breakpoints and condition(cpu, value) for watchpoints
+        self.breakpoints = {}
+        self.read_watchpoints = {}
+        self.write_watchpoints = {}
+
+    def add_breakpoint(self, addr, condition=None):
+        self.breakpoints[addr] = condition
+
+    def remove_breakpoint(self, addr):
+        self.breakpoints.pop(addr, None)
+
+    def add_watchpoint(self, addr, on_read=False, on_write=True, condition=None):
+        if on_read:
+            self.read_watchpoints[addr] = condition
+        if on_write:
+            self.write_watchpoints[addr] = condition
+
+    def remove_watchpoint(self, addr):
+        self.read_watchpoints.pop(addr, None)
+        self.write_watchpoints.pop(addr, None)
+
+    def has_breaks(self):
+        return bool(self.breakpoints or self.read_watchpoints or self.write_watchpoints)
+
+    def attach(self):
+        if self.attached:
+            return
+
+        self.attached = True
+        self.saved_step = self.cpu.step
+        self.saved_skip_idle_loops = self.motherboard.skip_idle_loops
+        self.bus_read_byte = self.memory_bus.read_byte
+        self.bus_write_byte = self.memory_bus.write_byte
+
+        self.cpu.step = self.debug_step
+        self.motherboard.skip_idle_loops = False
+        self.memory_bus.read_byte = self.watched_read_byte
+        self.memory_bus.write_byte = self.watched_write_byte
+
+    def detach(self):
+        if not self.attached:
+            return
+
+        self.attached = False
+        self.cpu.step = self.saved_step
+        self.motherboard.skip_idle_loops = self.saved_skip_idle_loops
+        ## Dropping the instance attributes brings back the MemoryBus methods
+        del self.memory_bus.read_byte
+        del self.memory_bus.write_byte
+
+    def debug_step(self):
+        cpu = self.cpu
+        if cpu.program_counter in self.breakpoints:
+            condition = self.breakpoints[cpu.program_counter]
+            if condition is None or condition(cpu):
+                self.break_handler('Breakpoint at ' + hex(cpu.program_counter))
+        return cpu.execute_step()
+
+    def watched_read_byte(self, addr):
+        value = self.bus_read_byte(addr)
+        if addr in self.read_watchpoints:
+            condition = self.read_watchpoints[addr]
+            if condition is None or condition(self.cpu, value):
+                self.break_handler('Read ' + hex(value) + ' from ' + hex(addr))
+        return value
+
+    ## Breaks before the value is stored, so the handler still sees the old one in memory
+    def watched_write_byte(self, addr, value):
+        if addr in self.write_watchpoints:
+            condition = self.write_watchpoints[addr]
+            if condition is None or condition(self.cpu, value):
+                self.break_handler('Write ' + hex(value & 0xFF) + ' to ' + hex(addr))
+        self.bus_write_byte(addr, value)
+
+    def pause(self, reason):
+        print(reason)
+        self.cpu.print_debug()
+        input('Continue....')
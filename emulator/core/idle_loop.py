@@ -0,0 +1,126 @@
+from emulator.core.instructions_dict import *
+from emulator.core.ppu import *
+
+MAX_IDLE_LOOP_LENGTH = 4
+
+## Registers that only change when the PPU steps into a new mode or line
+POLLED_REGISTERS = {LCD_Y, LCD_STAT}
+
+## Instructions allowed between the register read and the closing jump, they only touch A and F
+IDLE_LOOP_OPERATIONS = {'CP_D8', 'AND_D8', 'OR_D8', 'XOR_D8', 'AND_A', 'OR_A',
+                        'BIT_A_0', 'BIT_A_1', 'BIT_A_2', 'BIT_A_3', 'BIT_A_4', 'BIT_A_5', 'BIT_A_6', 'BIT_A_7'}
+
+IDLE_LOOP_JUMPS = {'JPR_NZ', 'JPR_Z', 'JPR_NC', 'JPR_C', 'JP_NZ', 'JP_Z', 'JP_NC', 'JP_C'}
+
+NOT_ANALYZED = object()
+
+
+class IdleLoop:
+    def __init__(self, body, condition, cycles):
+        self.body = body
+        self.condition = condition
+        self.cycles = cycles
+
+
+## Finds ROM loops like `LDH A,(44); CP 90; JR NZ` that just wait for LY/STAT to change,
+## and tells the motherboard how many whole iterations can be skipped before the PPU touches them again
+class IdleLoopDetector:
+    skipped_cycles = 0
+    skipped_loops = 0
+
+    def __init__(self, cpu):
+        self.cpu = cpu
+        self.memory_bus = cpu.memory_bus
+        self.loops = {}
+
+    def invalidate(self):
+        self.loops = {}
+
+    def get_loop(self, pc):
+        if pc > ROM_BANK_N_END:
+            return None
+
+        key = pc if pc < ROM_BANK_N_BEGIN else pc + self.memory_bus.cartridge.rom_bank_offset
+        loop = self.loops.get(key, NOT_ANALYZED)
+        if loop is NOT_ANALYZED:
+            loop = self.loops[key] = self.analyze_loop(pc)
+        return loop
+
+    def analyze_loop(self, start_pc):
+        read_byte = self.memory_bus.read_byte
+        ## Every idle loop starts by loading A from a polled register
+        opcode = read_byte(start_pc)
+        if opcode == 0xF0:
+            if 0xFF00 + read_byte(start_pc + 1) not in POLLED_REGISTERS:
+                return None
+        elif opcode == 0xFA:
+            if read_byte(start_pc + 2) << 8 | read_byte(start_pc + 1) not in POLLED_REGISTERS:
+                return None
+        else:
+            return None
+
+        body = []
+        cycles = 0
+        pc = start_pc
+        while len(body) < MAX_IDLE_LOOP_LENGTH:
+            opcode = read_byte(pc)
+            program_step = 1
+            if opcode == 0xCB:
+                opcode = read_byte(pc + 1)
+                program_step = 2
+                decoded = self.cpu._prefix_instruction_table[opcode]
+            else:
+                decoded = self.cpu._instruction_table[opcode]
+
+            if decoded is None:
+                return None
+
+            definition, handler = decoded
+            operands = [0x00] * 2
+            for i in range(definition.operands_number):
+                operands[i] = read_byte(pc + program_step)
+                program_step += 1
+            pc += program_step
+            cycles += definition.cycles
+
+            if definition.name in IDLE_LOOP_JUMPS:
+                if self.jump_target(definition, operands, pc) != start_pc:
+                    return None
+                operand_def = definition.name.split('_')[1]
+                cycles += self.cpu.taken_cycles(operand_def, 1)
+                return IdleLoop(body, self.cpu.condition_checker(operand_def), cycles)
+
+            if body and definition.name not in IDLE_LOOP_OPERATIONS:
+                return None
+            body.append((handler, operands[1] << 8 | operands[0]))
+
+        return None
+
+    def jump_target(self, definition:InstructionDefinition, operands, next_pc):
+        if definition.name.startswith('JPR'):
+            offset = operands[0]
+            return (next_pc + offset - 0x100 if offset > 0x7F else next_pc + offset) & 0xFFFF
+        return operands[1] << 8 | operands[0]
+
+    ## Runs one iteration of the loop body on the real registers and returns how many m-cycles can be skipped,
+    ## 0 when the loop is about to exit or there is no room before the next event
+    def skip_cycles(self, loop:IdleLoop, max_cycles):
+        iterations = max_cycles // (loop.cycles * 4)
+        if iterations == 0:
+            return 0
+
+        file = self.cpu.registers.file
+        saved_a = file[REG_A]
+        saved_f = file[REG_F]
+        for handler, immediate in loop.body:
+            handler(immediate)
+
+        if not loop.condition():
+            file[REG_A] = saved_a
+            file[REG_F] = saved_f
+            return 0
+
+        m_cycles = iterations * loop.cycles
+        self.skipped_loops += 1
+        self.skipped_cycles += m_cycles
+        return m_cycles
@@ -4,6 +4,17 @@ from emulator.core.ppu import *
 from emulator.core.cpu_v2 import *
 from emulator.core.timers import *
 from emulator.core.cartridge import *
+from emulator.core.idle_loop import *
+from emulator.core.scheduler import *
+
+## Longest stretch a halted CPU is skipped at once, so serial interrupts raised by the network thread are still noticed every scanline
+HALT_SKIP_LIMIT = 456
+
+## m-cycles in one frame, 154 lines of 456 T-cycles
+FRAME_CYCLES = 17556
+
+## An OAM DMA moves one byte per m-cycle
+DMA_CYCLES = 160
 
 class Motherboard:
     clock_cycle = 0
@@ -15,26 +26,172 @@ class Motherboard:
         self.memory_bus = MemoryBus(joypad, self.serial_port)
         self.ppu = PPU(self.memory_bus, screen)
         self.cpu = CPU_V2(self.memory_bus)
-        self.timer = GameboyTimer(self.memory_bus)
+        self.scheduler = Scheduler(self.cpu)
+        self.timer = GameboyTimer(self.memory_bus, self.scheduler)
         self.memory_bus.write_byte(JOYPAD, 0x3F)
+        self.idle_loops = IdleLoopDetector(self.cpu)
+        self.skip_idle_loops = False
+        self.dma_source = 0
+
+        ## The PPU sleeps until it can raise an interrupt or the CPU touches video state, this holds the cycle it was last brought to
+        self.ppu_cycle = 0
+        self.memory_bus.register_video_access_handler(self.video_access)
+        self.scheduler.schedule(PPU_EVENT, 0)
+        self.scheduler.schedule(TIMER_EVENT, 0)
 
     def insert_cartridge(self, cartridge:Cartridge):
         self.memory_bus.insert_cartridge(cartridge)
+        self.cpu.block_compiler.invalidate()
+        self.idle_loops.invalidate()
+
+    def set_block_compiler(self, enabled):
+        self.cpu.set_block_compiler(enabled)
+
+    def set_idle_loop_skipping(self, enabled):
+        self.skip_idle_loops = enabled
+
+    ## With timed DMA, OAM is only filled once the 160 m-cycles of the transfer have passed, and is locked for the CPU until then
+    def set_timed_dma(self, enabled):
+        if enabled:
+            self.memory_bus.register_io_write_hook(DMA, self.start_dma)
+        else:
+            self.memory_bus.register_io_write_hook(DMA, self.memory_bus.write_dma)
+
+    def start_dma(self, addr, value):
+        self.sync_ppu()
+        self.memory_bus.memory[addr] = value & 0xFF
+        self.dma_source = value & 0xFF
+        self.memory_bus.block_oam()
+        self.scheduler.schedule(DMA_EVENT, self.scheduler.current_cycle() + DMA_CYCLES * 4)
+
+    def finish_dma(self):
+        self.sync_ppu()
+        self.ppu.flush_lines()
+        self.memory_bus.dma(self.dma_source)
+        self.memory_bus.unblock_oam()
+        self.scheduler.cancel(DMA_EVENT)
+
+    ## Draws one frame out of render_interval, 0 keeps the PPU timing going without drawing at all
+    def set_frame_skip(self, render_interval):
+        self.ppu.render_interval = render_interval
+
+    def set_numpy_renderer(self, enabled):
+        self.ppu.set_numpy_renderer(enabled)
 
     def run_cycle(self):
+        return self.run_until(1)
+
+    ## Runs the whole machine until at least target_cycles m-cycles have elapsed and returns how many did.
+    ## The CPU runs freely up to the earliest scheduler deadline, then only the subsystems that are due get stepped
+    def run_until(self, target_cycles):
+        scheduler = self.scheduler
+        cpu = self.cpu
+        cpu_run_until = cpu.run_until
+        memory_bus = self.memory_bus
+        skip_idle_loops = self.skip_idle_loops
+
+        if self.joypad.key_pressed:
+            self.joypad.key_pressed = False
+            scheduler.schedule(JOYPAD_EVENT, scheduler.now)
+
+        start = scheduler.now
+        target = start + target_cycles * 4
         try:
-            if self.joypad.key_pressed:
-                self.memory_bus.request_joypad_interrupt()
-                self.joypad.key_pressed = False
+            while scheduler.now < target:
+                now = scheduler.now
+                if scheduler.next_deadline <= now:
+                    self.service_events()
+                    continue
 
-            m_cycles = self.cpu.execute_step()
-            global_cycles = m_cycles * 4
-            self.timer.step(global_cycles)
-            self.ppu.step(global_cycles)
-            self.clock_cycle += m_cycles
+                budget = min(scheduler.next_deadline, target) - now
+                if cpu.is_halt and not memory_bus.pending_interrupts:
+                    ## A halted CPU only wakes up on an interrupt, so it jumps straight to the next deadline
+                    elapsed = min((budget + 3) & ~3, HALT_SKIP_LIMIT)
+                else:
+                    elapsed = 0
+                    if skip_idle_loops:
+                        budget = self.idle_loop_budget(budget)
+                        elapsed = self.skip_idle_loop(budget)
+                    if not elapsed:
+                        elapsed = cpu_run_until((budget + 3) >> 2) << 2
 
-            return m_cycles
+                scheduler.now = now + elapsed
         except Exception as e:
-            self.cpu.print_debug()
+            cpu.print_debug()
             raise e
-        
+
+        cycles = (scheduler.now - start) >> 2
+        self.clock_cycle += cycles
+        return cycles
+
+    ## Runs until the PPU enters VBlank and returns the finished frame as palette indices, plus the m-cycles it took.
+    ## While the LCD is off no VBlank comes, so it gives up after one frame worth of cycles
+    def run_frame(self):
+        frame = self.ppu.frame_count
+        cycles = 0
+        while True:
+            self.sync_ppu()
+            if self.ppu.frame_count != frame or cycles >= FRAME_CYCLES:
+                break
+
+            vblank_cycles = self.ppu.cycles_to_vblank()
+            budget = FRAME_CYCLES - cycles
+            if vblank_cycles is not None:
+                budget = min(budget, (vblank_cycles + 3) >> 2)
+            cycles += self.run_until(max(budget, 1))
+
+        self.ppu.flush_lines()
+        return bytes(self.ppu.frame_buffer), cycles
+
+    def service_events(self):
+        scheduler = self.scheduler
+        now = scheduler.now
+
+        if scheduler.is_due(TIMER_EVENT):
+            self.timer.update()
+
+        if scheduler.is_due(PPU_EVENT):
+            self.sync_ppu()
+            ppu_cycles = self.ppu.cycles_to_next_interrupt()
+            ## While the LCD is off nothing happens until LCDC is written
+            scheduler.schedule(PPU_EVENT, now + ppu_cycles if ppu_cycles is not None else NEVER)
+
+        if scheduler.is_due(JOYPAD_EVENT):
+            self.memory_bus.request_joypad_interrupt()
+            scheduler.cancel(JOYPAD_EVENT)
+
+        if scheduler.is_due(DMA_EVENT):
+            self.finish_dma()
+
+    def sync_ppu(self):
+        now = self.scheduler.current_cycle()
+        self.ppu.catch_up(now - self.ppu_cycle)
+        self.ppu_cycle = now
+
+    def video_access(self, addr, is_write):
+        self.sync_ppu()
+        if is_write:
+            self.ppu.flush_lines()
+        ## LCD register writes can turn the LCD on or change which STAT interrupts are armed, so the PPU deadline is taken again right after
+        if is_write and addr >= LCD_CONTROL:
+            self.scheduler.schedule(PPU_EVENT, self.scheduler.current_cycle())
+
+    ## A loop polling LY/STAT keeps spinning until the PPU changes them, so whole iterations that end before the budget are skipped
+    def skip_idle_loop(self, budget):
+        if self.cpu.interrupts_enabled and self.memory_bus.pending_interrupts:
+            return 0
+
+        loop = self.idle_loops.get_loop(self.cpu.program_counter)
+        if loop is None:
+            return 0
+
+        return self.idle_loops.skip_cycles(loop, budget - 1) * 4
+
+    ## The PPU deadline can be a whole frame away, but LY/STAT change on every mode change and
+    ## polling loops are only looked for at the start of a CPU chunk, so chunks end there too
+    def idle_loop_budget(self, budget):
+        self.sync_ppu()
+        ppu_cycles = self.ppu.cycles_to_next_event()
+        if ppu_cycles is not None and ppu_cycles < budget:
+            return ppu_cycles
+        return budget
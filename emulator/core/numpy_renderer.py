@@ -0,0 +1,119 @@
+import numpy as np
+from emulator.core.ppu import *
+
+## Optional renderer for CPython, where the per pixel loops of PPU.render_line are too slow.
+## Lines are not drawn when the PPU reaches them but queued, and the queue is drawn as one block of lines with array
+## gathers and masks when the PPU enters VBlank or right before video memory or an LCD register is written, so every
+## queued line sees the same video state it would have seen when it was reached. Usually that is one block per frame.
+## Memory is read through a NumPy view of the bus memory, and the output matches PPU.render_line pixel for pixel
+class NumpyRenderer:
+
+    def __init__(self, ppu:PPU):
+        self.ppu = ppu
+        self.memory = np.frombuffer(ppu.memory_bus.memory, dtype=np.uint8)
+        self.frame = np.frombuffer(ppu.frame_buffer, dtype=np.uint8).reshape(SCREEN_HEIGHT, SCREEN_WIDTH)
+        self.palettes = np.frombuffer(b''.join(PALETTE_TABLES), dtype=np.uint8).reshape(256, 256)
+        self.columns = np.arange(SCREEN_WIDTH)
+        self.object_columns = np.arange(8)
+        self.pending_lines = []
+        self.pending_objects = []
+
+    def render_line(self):
+        self.pending_lines.append(self.ppu.line_rendered)
+        self.pending_objects.append(self.ppu.oam_objects)
+
+    def flush(self):
+        if not self.pending_lines:
+            return
+
+        ppu = self.ppu
+        lines = np.array(self.pending_lines)
+        objects = self.pending_objects
+        self.pending_lines = []
+        self.pending_objects = []
+
+        blank = np.zeros((len(lines), SCREEN_WIDTH), dtype=np.uint8)
+        bg_lines = self.render_bg_lines(lines) if ppu.bg_window_enable else blank
+        obj_lines = self.render_obj_lines(objects) if ppu.obj_enable else blank
+
+        ## 0xFF is a transparent object pixel, 0xF0 marks objects drawn behind background colors 1-3
+        behind_bg = ((obj_lines & 0xF0) != 0) & (bg_lines != 0)
+        frame_lines = np.where((obj_lines == 0xFF) | behind_bg, bg_lines, obj_lines & 0x03)
+
+        self.frame[lines] = frame_lines
+        draw_line = ppu.screen.draw_line
+        for i in range(len(lines)):
+            draw_line(int(lines[i]), frame_lines[i].tobytes())
+
+    ## Palette indices at the given lines and columns of a 256x256 tile map
+    def map_pixels(self, map_start, signed_tiles, map_lines, map_columns):
+        memory = self.memory
+        map_lines = map_lines[:, None]
+        tile_indices = memory[map_start + (map_lines >> 3) * 32 + (map_columns >> 3)].astype(np.intp)
+        rows = (tile_indices << 3) + (map_lines & 0x7)
+        if signed_tiles:
+            rows += np.where(tile_indices < 128, SIGNED_TILE_ROWS, 0)
+
+        addrs = TILE_DATA_BEGIN + (rows << 1)
+        shift = 7 - (map_columns & 0x7)
+        least = (memory[addrs] >> shift) & 0x1
+        most = (memory[addrs + 1] >> shift) & 0x1
+        return ((most << 1) | least).astype(np.uint8)
+
+    def render_bg_lines(self, lines):
+        ppu = self.ppu
+        memory = self.memory
+        signed_tiles = not ppu.bg_window_tiles
+        palette = self.palettes[memory[BG_W_PALETTE]]
+
+        tile_map_start = TILE_MAP_2_START if ppu.bg_tile_map else TILE_MAP_1_START
+        map_lines = (lines + int(memory[BG_SCROLL_Y])) & 0xFF
+        map_columns = (self.columns + int(memory[BG_SCROLL_X])) & 0xFF
+        pixels = self.map_pixels(tile_map_start, signed_tiles, map_lines, map_columns)
+
+        window_x = max(int(memory[W_SCROLL_X]) - 7, 0)
+        window_lines = lines - int(memory[W_SCROLL_Y])
+        if ppu.window_enable and window_x < SCREEN_WIDTH and (window_lines >= 0).any():
+            tile_map_start = TILE_MAP_2_START if ppu.window_tile_map else TILE_MAP_1_START
+            window_columns = self.columns - window_x
+            window_pixels = self.map_pixels(tile_map_start, signed_tiles, np.maximum(window_lines, 0), np.maximum(window_columns, 0))
+            in_window = (window_lines >= 0)[:, None] & (window_columns >= 0)
+            pixels = np.where(in_window, window_pixels, pixels)
+
+        return palette[pixels]
+
+    ## Objects are drawn rank by rank, the rightmost object of every line first, so the leftmost one ends up on top
+    def render_obj_lines(self, objects):
+        memory = self.memory
+        obp0_palette = self.palettes[memory[OBP0]]
+        obp1_palette = self.palettes[memory[OBP1]]
+
+        ranks = []
+        for line_index, line_objects in enumerate(objects):
+            line_objects.sort(key=lambda obj: obj.x_position, reverse=True)
+            rank = 0
+            for obj in line_objects:
+                if obj.x_position < 8 or obj.x_position >= 168:
+                    continue
+                if rank == len(ranks):
+                    ranks.append(([], [], [], []))
+                rank_lines, rank_x, rank_attributes, rank_pixels = ranks[rank]
+                rank_lines.append(line_index)
+                rank_x.append(obj.x_position)
+                rank_attributes.append(obj.attributes)
+                rank_pixels.append(obj.pixels)
+                rank += 1
+
+        obj_pixels = np.full((len(objects), SCREEN_WIDTH + 8), 0xFF, dtype=np.uint8)
+        for rank_lines, rank_x, rank_attributes, rank_pixels in ranks:
+            attributes = np.array(rank_attributes)[:, None]
+            pixels = np.frombuffer(b''.join(rank_pixels), dtype=np.uint8).reshape(-1, 8)
+            colors = np.where(attributes & 0x10, obp1_palette[pixels], obp0_palette[pixels])
+            colors |= np.where(attributes & 0x80, 0xF0, 0x00).astype(np.uint8)
+
+            opaque = pixels != 0
+            line_indices = np.broadcast_to(np.array(rank_lines)[:, None], pixels.shape)
+            columns = (np.array(rank_x)[:, None] - 8) + self.object_columns
+            obj_pixels[line_indices[opaque], columns[opaque]] = colors[opaque]
+
+        return obj_pixels[:, :SCREEN_WIDTH]
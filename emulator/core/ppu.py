@@ -1,4 +1,5 @@
 from emulator.core.bus import *
+from emulator.core.tile_cache import *
 
 TILE_MAP_1_START = 0x9800
 TILE_MAP_1_END = 0x9BFF
@@ -24,6 +25,31 @@ BG_W_PALETTE = 0xFF47
 OBP0 = 0xFF48
 OBP1 = 0xFF49
 
+SCREEN_WIDTH = 160
+SCREEN_HEIGHT = 144
+
+## PPU modes, numbered like the mode bits of STAT. LINE_END is the instant a visible line is over and the next one not started yet
+MODE_0 = 0
+MODE_1 = 1
+MODE_2 = 2
+MODE_3 = 3
+LINE_END = 4
+
+LINE_CYCLES = 456
+MODE_3_START = 80
+MODE_0_START = 256
+## Mode of a visible line at each of its cycles, the last entry is the end of the line
+SCANLINE_MODES = bytes([MODE_2] * MODE_3_START + [MODE_3] * (MODE_0_START - MODE_3_START) + [MODE_0] * (LINE_CYCLES - MODE_0_START) + [LINE_END])
+## STAT bit enabling the interrupt on entering each mode
+STAT_MODE_INTERRUPTS = [0x08, 0x10, 0x20, 0x00, 0x00]
+
+## LCDC decoded once for each of its values: LCD enable, window tile map, window enable, BG/window tile data,
+## BG tile map, object size, object enable, BG/window enable
+LCD_CONTROL_FIELDS = [tuple(bool(value >> bit & 0x1) for bit in range(7, -1, -1)) for value in range(256)]
+
+## bytes.translate tables from palette indices to shades, one for every value of a palette register
+PALETTE_TABLES = [bytes([palette >> ((index & 0b11) << 1) & 0b11 for index in range(256)]) for palette in range(256)]
+
 
 class OAMObject:
     y_position = 0x00
@@ -32,9 +58,9 @@ class OAMObject:
     tile_line = 0x00
     extended_size = False
     attributes = 0x00
-    pixels = [0x00] * 8
 
     def __init__(self, y, x, t, tl, a, extended_size):
+        self.pixels = [0x00] * 8
         self.y_position = y
         self.x_position = x
         self.tile_index = t
@@ -54,175 +80,248 @@ class PPU:
     line_rendered = 0
     stat_line_trigger = False
 
-    actual_mode = 'MODE_2'
+    actual_mode = MODE_2
 
     total_pixels = 256
     grid_size = 32
     
-    oam_objects:list[OAMObject] = []
     calculator = Calculator()
 
-    bg_pixel_buffer = [0x00] * 168
-    wd_pixel_buffer = [0x00] * 160
-    obj_pixel_buffer = [0x00] * 168
-    pixel_buffer = [0x00] * 160
-
     raw_lcd_control = 0x00
-    decoded_lcd_control = {
-        'LCD_ENABLE': False,
-        'W_TILE_MAP': False,
-        'WINDOW_ENABLE': False,
-        'BG_W_TILES': False,
-        'BG_TILE_MAP': False,
-        'OBJ_SIZE': False,
-        'OBJ_ENABLE': False,
-        'BG_W_ENABLE': False,
-    }
+    lcd_enable = False
+    window_tile_map = False
+    window_enable = False
+    bg_window_tiles = False
+    bg_tile_map = False
+    obj_size = False
+    obj_enable = False
+    bg_window_enable = False
 
     render_next_frame = True
+    frame_count = 0
+    ## Frame skip only leaves out OAM scan and drawing, LY/STAT/VBlank timing stays the same.
+    ## One frame out of render_interval is drawn (0 draws none), and frames_to_skip more are left out on request
+    render_interval = 1
+    frames_to_skip = 0
 
     def __init__(self, memory_bus:MemoryBus, screen):
         self.screen = screen
         self.memory_bus = memory_bus
+        ## Kept from before a debugger can shadow the bus read_byte, so PPU reads never trip CPU watchpoints
+        self.read_byte = memory_bus.read_byte
+        self.oam_objects:list[OAMObject] = []
+        self.obj_pixel_buffer = [0x00] * 168
+        self.pixel_buffer = [0x00] * 160
+        ## Palette indices (0-3) of the last rendered lines, one byte per pixel
+        self.frame_buffer = bytearray(SCREEN_WIDTH * SCREEN_HEIGHT)
+        self.tile_cache = TileCache(memory_bus.memory)
+        self.tile_map_lines = TileMapLineCache(memory_bus.memory, self.tile_cache)
+        memory_bus.register_vram_write_handler(self.vram_write)
+        self.line_renderer = self.render_line
+        self.flush_lines = self.draw_pending_lines
 
     def step(self, cycles):
         self.cycles += cycles
 
-        if not self.decoded_lcd_control['LCD_ENABLE']:
+        if not self.lcd_enable:
             self.get_lcd_control()
             return
 
         new_mode = self.get_scanline_mode()
-        changed = self.actual_mode != new_mode
-        if changed:
+        if self.actual_mode != new_mode:
             self.update_stat()
             self.get_lcd_control()
             self.actual_mode = new_mode
 
-        if self.actual_mode == 'MODE_1' and changed:
-            ##self.render_next_frame = not self.render_next_frame
-            self.memory_bus.request_vblank_interrupt()
-
-        if self.actual_mode == 'MODE_2' and changed and self.render_next_frame:
-            self.oam_objects = self.oam_scan(self.line_rendered)
-            self.oam_fetch()
-        
-        if self.actual_mode == 'MODE_3' and changed and self.render_next_frame:
-            pixel_bg_line = self.render_bg_line() if self.decoded_lcd_control['BG_W_ENABLE'] else [0x00] * 160
-            pixel_obj_line = self.render_obj_line() if self.decoded_lcd_control['OBJ_ENABLE'] else [0x00] * 160
-
-            for i in range(160):
-                priority = bool(pixel_obj_line[i] & 0xF0)
-                if priority and pixel_bg_line[i] != 0:
-                    self.pixel_buffer[i] = pixel_bg_line[i]
-                else:
-                    if pixel_obj_line[i] != 0xFF:
-                        self.pixel_buffer[i] = pixel_obj_line[i]
-                    else:
-                        self.pixel_buffer[i] = pixel_bg_line[i]
-
-            self.screen.draw_line(self.line_rendered, self.pixel_buffer)
-        
-        if self.cycles >= 456:
+            if new_mode == MODE_1:
+                self.flush_lines()
+                self.frame_count += 1
+                self.render_next_frame = self.select_next_frame()
+                self.memory_bus.request_vblank_interrupt()
+            elif new_mode == MODE_2 and self.render_next_frame:
+                self.oam_objects = self.oam_scan(self.line_rendered)
+                self.oam_fetch()
+            elif new_mode == MODE_3 and self.render_next_frame:
+                self.line_renderer()
+
+        if self.cycles >= LINE_CYCLES:
             self.stat_line_trigger = False
             self.line_rendered += 1
             self.update_stat()
             self.get_lcd_control()
             if self.line_rendered > 153:
                 self.line_rendered = 0
-            self.cycles = self.cycles % 456
+            self.cycles = self.cycles % LINE_CYCLES
+
+    ## NumPy is only imported when its renderer is asked for, the emulator does not depend on it otherwise
+    def set_numpy_renderer(self, enabled):
+        self.flush_lines()
+        if enabled:
+            from emulator.core.numpy_renderer import NumpyRenderer
+            renderer = NumpyRenderer(self)
+            self.line_renderer = renderer.render_line
+            self.flush_lines = renderer.flush
+        else:
+            self.line_renderer = self.render_line
+            self.flush_lines = self.draw_pending_lines
+
+    ## render_line draws every line right away, renderers that queue lines draw them here. Called before the video state
+    ## the queued lines depend on is written, and when the frame is over
+    def draw_pending_lines(self):
+        pass
+
+    def select_next_frame(self):
+        if self.frames_to_skip > 0:
+            self.frames_to_skip -= 1
+            return False
+
+        if self.render_interval == 0:
+            return False
+
+        return self.frame_count % self.render_interval == 0
+
+    ## Asks to leave out the next count frames. Requests made while frames are already being skipped are dropped,
+    ## so a host that keeps falling behind still gets one frame drawn between two runs of skipped ones
+    def skip_frames(self, count):
+        if self.render_next_frame and self.frames_to_skip == 0:
+            self.frames_to_skip = count
+
+    def render_line(self):
+        pixel_bg_line = self.render_bg_line() if self.bg_window_enable else [0x00] * 160
+        pixel_obj_line = self.render_obj_line() if self.obj_enable else [0x00] * 160
+
+        for i in range(160):
+            priority = bool(pixel_obj_line[i] & 0xF0)
+            if priority and pixel_bg_line[i] != 0:
+                self.pixel_buffer[i] = pixel_bg_line[i]
+            else:
+                if pixel_obj_line[i] != 0xFF:
+                    self.pixel_buffer[i] = pixel_obj_line[i] & 0x03
+                else:
+                    self.pixel_buffer[i] = pixel_bg_line[i]
+
+        line_start = self.line_rendered * SCREEN_WIDTH
+        self.frame_buffer[line_start:line_start + SCREEN_WIDTH] = self.pixel_buffer
+        self.screen.draw_line(self.line_rendered, self.pixel_buffer)
+
+    ## Brings the PPU forward by cycles at once, stepping through every mode change on the way,
+    ## so all the scanlines pending since the last catch-up are rendered in one go
+    def catch_up(self, cycles):
+        while self.lcd_enable:
+            next_event = self.cycles_to_next_event()
+            if cycles < next_event:
+                break
+            self.step(next_event)
+            cycles -= next_event
+
+        self.step(cycles)
+
+    ## Cycles until step() can raise a VBlank or STAT interrupt, None while the LCD is off.
+    ## Without STAT mode interrupts only the VBlank line and the lines around LYC need to be stepped on time
+    def cycles_to_next_interrupt(self):
+        cycles = self.cycles_to_next_event()
+        stat = self.memory_bus.memory[LCD_STAT]
+        if cycles is None or stat & 0x38:
+            return cycles
+
+        line = self.line_rendered
+        lines = (144 - line) % 154
+        if stat & 0x40:
+            lyc = self.memory_bus.memory[LCD_YC]
+            if line == lyc:
+                return cycles
+            lines = min(lines, (lyc - 1 - line) % 154)
+
+        if lines == 0:
+            return cycles
+
+        return max(cycles, lines * LINE_CYCLES - self.cycles)
+
+    ## Cycles until step() enters VBlank, None while the LCD is off
+    def cycles_to_vblank(self):
+        if not self.lcd_enable:
+            return None
+
+        lines = (144 - self.line_rendered) % 154
+        if lines == 0 and self.actual_mode == MODE_1:
+            lines = 154
+
+        return max(lines * LINE_CYCLES + 4 - self.cycles, 0)
+
+    ## Cycles until step() changes mode or finishes the line, None while the LCD is off
+    def cycles_to_next_event(self):
+        if not self.lcd_enable:
+            return None
+
+        cycles = self.cycles
+        if cycles >= LINE_CYCLES or self.get_scanline_mode() != self.actual_mode:
+            return 4
 
-            
-        
-    def get_scanline_mode(self):
         if self.line_rendered > 143:
-            return 'MODE_1'
-        
-        if self.cycles < 80:
-            return 'MODE_2'
-        
-        if self.cycles >= 80 and self.cycles < 256:
-            return 'MODE_3'
+            return LINE_CYCLES - cycles
 
-        if self.cycles >= 256 and self.cycles < 456:
-            return 'MODE_0'
+        if cycles < MODE_3_START:
+            return MODE_3_START - cycles
 
-    def render_bg_line(self): 
-        read_byte = self.memory_bus.read_byte
-        tile_add_resolver = self.tile_add_resolver
-        read_tile_line = self.read_tile_line
+        if cycles < MODE_0_START:
+            return MODE_0_START - cycles
 
-        y_offset = read_byte(BG_SCROLL_Y)
-        x_offset = read_byte(BG_SCROLL_X)
-        palette_map = self.build_palette_map(BG_W_PALETTE)
-        viewport_line = (self.line_rendered + y_offset) % 256
-        tile_line_offset = viewport_line % 8
-        tile_map_offset = int(viewport_line / 8)
+        return LINE_CYCLES - cycles
 
-        window_buffer = []
-        if self.decoded_lcd_control['WINDOW_ENABLE']:
-            window_buffer = self.render_wd_line()
+    def get_scanline_mode(self):
+        if self.line_rendered > 143:
+            return MODE_1
 
-        window_x_len = len(window_buffer)
-        if window_x_len == 160:
-            return [palette_map[p] for p in window_buffer]
+        if self.cycles >= LINE_CYCLES:
+            return LINE_END
 
-        tile_addresing = not self.decoded_lcd_control['BG_W_TILES']
-        tile_map_start = TILE_MAP_2_START if self.decoded_lcd_control['BG_TILE_MAP'] else TILE_MAP_1_START
-        window_x_offset = 160 - window_x_len
-        for i in range(21):
-            if i * 8 > window_x_offset:
-                continue
+        return SCANLINE_MODES[self.cycles]
 
-            tile_map_x = (i + int(x_offset/8)) % 32
-            tile_map_addr = (tile_map_start + tile_map_x) + (tile_map_offset * 32)
-            tile_index = read_byte(tile_map_addr)
-            tile_addr = tile_add_resolver(tile_index, tile_addresing)
-            pixels = read_tile_line(tile_addr, tile_line_offset)
+    ## Background and window lines are slices of the cached tile map lines, only the palette is applied per line
+    def render_bg_line(self):
+        memory = self.memory_bus.memory
+        y_offset = memory[BG_SCROLL_Y]
+        x_offset = memory[BG_SCROLL_X]
+        palette_table = PALETTE_TABLES[memory[BG_W_PALETTE]]
 
-            start = i * 8
-            self.bg_pixel_buffer[start: start+8] = pixels
+        window_buffer = b''
+        if self.window_enable:
+            window_buffer = self.render_wd_line()
 
-        x_diff = x_offset % 8
-        self.bg_pixel_buffer = self.bg_pixel_buffer[x_diff:]
-        self.bg_pixel_buffer[window_x_offset:] = window_buffer
+        window_x_offset = 160 - len(window_buffer)
+        if window_x_offset == 0:
+            return window_buffer.translate(palette_table)
 
-        return [palette_map[p] for p in self.bg_pixel_buffer]
+        signed_tiles = not self.bg_window_tiles
+        tile_map_start = TILE_MAP_2_START if self.bg_tile_map else TILE_MAP_1_START
+        line = self.tile_map_lines.get_line(tile_map_start, signed_tiles, (self.line_rendered + y_offset) & 0xFF)
+
+        ## The map wraps around horizontally
+        pixels = line[x_offset:x_offset + window_x_offset]
+        if len(pixels) < window_x_offset:
+            pixels += line[:window_x_offset - len(pixels)]
+
+        return (pixels + window_buffer).translate(palette_table)
     
     def render_wd_line(self):
-        read_byte = self.memory_bus.read_byte
-        tile_add_resolver = self.tile_add_resolver
-        read_tile_line = self.read_tile_line
-        
-        window_y = read_byte(W_SCROLL_Y)
+        memory = self.memory_bus.memory
+        window_y = memory[W_SCROLL_Y]
         if window_y > self.line_rendered:
-            return []
+            return b''
         
-        window_x = read_byte(W_SCROLL_X) - 7
+        window_x = memory[W_SCROLL_X] - 7
         if window_x < 0:
             window_x = 0
-        
-
-        viewport_line = self.line_rendered - window_y
-        tile_line_offset = viewport_line % 8
-        tile_map_offset = int(viewport_line / 8)
-
-        tile_addresing = not self.decoded_lcd_control['BG_W_TILES']
-        tile_map_start = TILE_MAP_2_START if self.decoded_lcd_control['W_TILE_MAP'] else TILE_MAP_1_START
-        for i in range(20): ## x tile size
-            tile_map_x = i
-            tile_map_addr = (tile_map_start + tile_map_x) + (tile_map_offset * 32)
-            tile_index = read_byte(tile_map_addr)
-            tile_addr = tile_add_resolver(tile_index, tile_addresing)
-            pixels = read_tile_line(tile_addr, tile_line_offset)
+        if window_x >= 160:
+            return b''
 
-            start = i * 8
-            self.wd_pixel_buffer[start: start+8] = pixels
-
-        return self.wd_pixel_buffer[0:160-window_x]
+        signed_tiles = not self.bg_window_tiles
+        tile_map_start = TILE_MAP_2_START if self.window_tile_map else TILE_MAP_1_START
+        line = self.tile_map_lines.get_line(tile_map_start, signed_tiles, self.line_rendered - window_y)
+        return line[0:160 - window_x]
     
     def build_palette_map(self, palette_addr):
-        palette = self.memory_bus.read_byte(palette_addr)
+        palette = self.read_byte(palette_addr)
         p_0 = palette & 0b11
         p_1 = palette >> 2 & 0b11
         p_2 = palette >> 4 & 0b11
@@ -246,14 +345,13 @@ class PPU:
         self.oam_objects.sort(key=lambda obj: obj.x_position, reverse=True)
         for obj in self.oam_objects:
             mask = 0xF0 if self.calculator.verify_bit(obj.attributes, 7) else 0x00
-            x_inverted = self.calculator.verify_bit(obj.attributes, 5)
             palette_map = obp1_palette_map if self.calculator.verify_bit(obj.attributes, 4) else obp0_palette_map
 
+            ## X-flipped objects already got their row mirrored by oam_fetch
             for i in range(8):
                 if obj.x_position >= 8 and obj.x_position < 168:
-                    pixel_index = i if not x_inverted else 7-i
-                    if obj.pixels[pixel_index] != 0:
-                        self.obj_pixel_buffer[(obj.x_position - 8) + i] = palette_map[obj.pixels[pixel_index]] | mask
+                    if obj.pixels[i] != 0:
+                        self.obj_pixel_buffer[(obj.x_position - 8) + i] = palette_map[obj.pixels[i]] | mask
             
         return self.obj_pixel_buffer[:160]
 
@@ -263,25 +361,18 @@ class PPU:
         else:
             return (tile_index * 16) + TILE_DATA_BLOCK_2 if tile_index < 128 else (tile_index * 16) + TILE_DATA_BLOCK_0
 
+    def vram_write(self, addr):
+        self.tile_cache.write(addr)
+        self.tile_map_lines.write(addr)
+
+    ## Rows come decoded from the tile cache, they are shared so callers must not modify them
     def read_tile_line(self, tile_addr, line_index):
-        line_addr = tile_addr + (line_index * 2)
-        least_byte_addr = self.memory_bus.read_byte(line_addr)
-        most_byte_addr = self.memory_bus.read_byte(line_addr + 1)
-
-        pixels = [0x0] * 8
-        mask = 0b10000000
-        for i in range(8):
-            most_bit = (most_byte_addr & mask) >> 7-i
-            least_bit = (least_byte_addr & mask) >> 7-i
-            pixel = most_bit << 1 | least_bit
-            pixels[i] = pixel
-            mask = mask >> 1
-        return pixels
+        return self.tile_cache.rows[((tile_addr - TILE_DATA_BEGIN) >> 1) + line_index]
     
     def oam_scan(self, line_index):
-        read_byte = self.memory_bus.read_byte
+        read_byte = self.read_byte
 
-        obj_extended = self.decoded_lcd_control['OBJ_SIZE']
+        obj_extended = self.obj_size
         addr = OAM_START
         oam_objects = []
 
@@ -305,7 +396,8 @@ class PPU:
     
     def oam_fetch(self):
         tile_add_resolver = self.tile_add_resolver
-        read_tile_line = self.read_tile_line
+        rows = self.tile_cache.rows
+        flipped_rows = self.tile_cache.flipped_rows
         for obj in self.oam_objects:
             tile_line = obj.tile_line
             if obj.extended_size:
@@ -319,58 +411,45 @@ class PPU:
 
             y_inverted = self.calculator.verify_bit(obj.attributes, 6)
             tile_line = tile_line if not y_inverted else 7 - tile_line
-            tile_line = read_tile_line(tile_addr, tile_line)
-            obj.pixels = tile_line
+            x_inverted = self.calculator.verify_bit(obj.attributes, 5)
+            row = ((tile_addr - TILE_DATA_BEGIN) >> 1) + tile_line
+            obj.pixels = flipped_rows[row] if x_inverted else rows[row]
 
     def update_stat(self):
-        lyc = self.memory_bus.read_byte(LCD_YC)
-        ly = self.memory_bus.read_byte(LCD_Y)
-        stat = self.memory_bus.read_byte(LCD_STAT)
+        memory = self.memory_bus.memory
+        lyc = memory[LCD_YC]
+        ly = memory[LCD_Y]
+        stat = memory[LCD_STAT]
 
+        mode = self.actual_mode
         mode_ind = 0x00
         trigger_int = False
 
-        if lyc == ly and self.calculator.verify_bit(stat, 6) and not self.stat_line_trigger:
+        if lyc == ly and stat & 0x40 and not self.stat_line_trigger:
             trigger_int = True
             self.stat_line_trigger = True
 
-        if self.actual_mode == 'MODE_0' and self.calculator.verify_bit(stat, 3):
-            trigger_int = True
-            mode_ind = 0
-
-        if self.actual_mode == 'MODE_1' and self.calculator.verify_bit(stat, 4):
+        ## The mode bits of STAT are only set for modes 1 and 2 when their interrupt is enabled
+        if stat & STAT_MODE_INTERRUPTS[mode]:
             trigger_int = True
-            mode_ind = 1
+            mode_ind = mode
 
-        if self.actual_mode == 'MODE_2' and self.calculator.verify_bit(stat, 5):
-            trigger_int = True
-            mode_ind = 2
-
-        if self.actual_mode == 'MODE_3':
+        if mode == MODE_3:
             mode_ind = 3
 
         ly_lyc = 0xb100 if lyc == ly else 0x0
 
         stat = stat & 0xF8 | ly_lyc | mode_ind
-        self.memory_bus.write_byte(LCD_Y, self.line_rendered)
-        self.memory_bus.write_byte(LCD_STAT, stat)
+        memory[LCD_Y] = self.line_rendered
+        memory[LCD_STAT] = stat & 0xFF
 
         if trigger_int:
             self.memory_bus.request_stat_interrupt()
 
     def get_lcd_control(self):
-        lcd_control_register = self.memory_bus.read_byte(LCD_CONTROL)
+        lcd_control_register = self.memory_bus.memory[LCD_CONTROL]
 
         if self.raw_lcd_control != lcd_control_register:
             self.raw_lcd_control = lcd_control_register
-            self.decoded_lcd_control = {
-            'LCD_ENABLE': self.calculator.verify_bit(lcd_control_register, 7),
-            'W_TILE_MAP': self.calculator.verify_bit(lcd_control_register, 6),
-            'WINDOW_ENABLE': self.calculator.verify_bit(lcd_control_register, 5),
-            'BG_W_TILES': self.calculator.verify_bit(lcd_control_register, 4),
-            'BG_TILE_MAP': self.calculator.verify_bit(lcd_control_register, 3),
-            'OBJ_SIZE': self.calculator.verify_bit(lcd_control_register, 2),
-            'OBJ_ENABLE': self.calculator.verify_bit(lcd_control_register, 1),
-            'BG_W_ENABLE': self.calculator.verify_bit(lcd_control_register, 0),
-        }
-
+            (self.lcd_enable, self.window_tile_map, self.window_enable, self.bg_window_tiles,
+             self.bg_tile_map, self.obj_size, self.obj_enable, self.bg_window_enable) = LCD_CONTROL_FIELDS[lcd_control_register]
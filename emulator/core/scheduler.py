@@ -0,0 +1,41 @@
+## Event slots, one per subsystem that needs the CPU to stop at a given cycle
+PPU_EVENT = 0
+TIMER_EVENT = 1
+JOYPAD_EVENT = 2
+DMA_EVENT = 3
+EVENT_SLOTS = 4
+
+NEVER = 1 << 62
+
+
+## Fixed slot table of absolute deadlines in T-cycles. The motherboard lets the CPU run until next_deadline,
+## then services every slot that is due and asks it for its next deadline
+class Scheduler:
+    now = 0
+
+    def __init__(self, cpu):
+        self.cpu = cpu
+        self.deadlines = [NEVER] * EVENT_SLOTS
+        self.next_deadline = NEVER
+
+    ## now only moves between CPU runs, while the CPU is running it is ahead by the cycles it already executed
+    def current_cycle(self):
+        return self.now + (self.cpu.run_cycles << 2)
+
+    def schedule(self, event, deadline):
+        self.deadlines[event] = deadline
+        self.next_deadline = min(self.deadlines)
+
+        ## An event moved before the end of the running CPU chunk cuts the chunk short
+        cpu = self.cpu
+        if deadline < self.now + (cpu.run_target << 2):
+            cpu.run_target = (deadline - self.now + 3) >> 2
+
+    def schedule_in(self, event, cycles):
+        self.schedule(event, self.now + cycles)
+
+    def cancel(self, event):
+        self.schedule(event, NEVER)
+
+    def is_due(self, event):
+        return self.deadlines[event] <= self.now
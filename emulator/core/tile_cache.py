@@ -0,0 +1,90 @@
+## 384 tiles of 16 bytes in 0x8000-0x97FF, 8 rows of 2 bytes each
+TILE_DATA_BEGIN = 0x8000
+TILE_DATA_END = 0x97FF
+TILE_COUNT = 384
+TILE_ROWS = TILE_COUNT * 8
+
+
+## Every tile row is kept decoded into 8 palette indices (0-3), plus a mirrored copy for X-flipped objects.
+## A row is decoded again only when one of its two bytes is written, the renderer just looks the rows up
+class TileCache:
+
+    def __init__(self, memory):
+        self.memory = memory
+        self.rows = [bytes(8)] * TILE_ROWS
+        self.flipped_rows = [bytes(8)] * TILE_ROWS
+        for row in range(TILE_ROWS):
+            self.decode_row(row)
+
+    ## Called by the memory bus after every VRAM write
+    def write(self, addr):
+        if addr > TILE_DATA_END:
+            return
+        self.decode_row((addr - TILE_DATA_BEGIN) >> 1)
+
+    def decode_row(self, row):
+        addr = TILE_DATA_BEGIN + (row << 1)
+        least = self.memory[addr]
+        most = self.memory[addr + 1] << 1
+        pixels = bytes([(most >> shift & 0b10) | (least >> shift & 0b1) for shift in range(7, -1, -1)])
+        self.rows[row] = pixels
+        self.flipped_rows[row] = pixels[::-1]
+
+
+TILE_MAP_BEGIN = 0x9800
+TILE_MAP_HIGH = 0x9C00
+TILE_MAP_END = 0x9FFF
+## Rows of tile 0-127 in the signed (0x8800) addressing, which live at 0x9000
+SIGNED_TILE_ROWS = 0x800
+## One entry per (tile map, tile addressing, pixel line of the 256x256 map)
+MAP_LINES = 2 * 2 * 256
+
+
+## Whole 256 pixel lines of the two tile maps, as palette indices, built on first use and kept until their tiles change.
+## A tile map write only drops the 8 lines of its tile row, a tile data write drops every line since any of them may use it
+class TileMapLineCache:
+
+    def __init__(self, memory, tile_cache:TileCache):
+        self.memory = memory
+        self.tile_cache = tile_cache
+        self.lines = [None] * MAP_LINES
+        self.empty = True
+
+    def get_line(self, map_start, signed_tiles, line):
+        index = (map_start == TILE_MAP_HIGH) << 9 | signed_tiles << 8 | line
+        pixels = self.lines[index]
+        if pixels is None:
+            pixels = self.build_line(map_start, signed_tiles, line)
+            self.lines[index] = pixels
+            self.empty = False
+        return pixels
+
+    def build_line(self, map_start, signed_tiles, line):
+        memory = self.memory
+        rows = self.tile_cache.rows
+        map_addr = map_start + (line >> 3) * 32
+        tile_line = line & 0x7
+
+        tiles = [None] * 32
+        for i in range(32):
+            tile_index = memory[map_addr + i]
+            row = (tile_index << 3) + tile_line
+            if signed_tiles and tile_index < 128:
+                row += SIGNED_TILE_ROWS
+            tiles[i] = rows[row]
+        return b''.join(tiles)
+
+    ## Called by the memory bus after every VRAM write
+    def write(self, addr):
+        if addr < TILE_MAP_BEGIN:
+            if not self.empty:
+                self.lines = [None] * MAP_LINES
+                self.empty = True
+            return
+
+        first_line = ((addr >> 5) & 0x1F) << 3
+        map_index = (addr >= TILE_MAP_HIGH) << 9
+        lines = self.lines
+        for signed_tiles in (0, 1 << 8):
+            index = map_index | signed_tiles | first_line
+            lines[index:index + 8] = [None] * 8
@@ -1,12 +1,15 @@
 from emulator.core.bus import *
+from emulator.core.scheduler import *
 
+## DIV and TIMA are not stepped, they are derived from the T-cycle count since DIV was last reset.
+## The registers are only brought up to date when the CPU touches them or when TIMA is due to overflow
 class GameboyTimer:
     global_clock = 4194304
-    divider_clock = 16384
-    divider_step_limit = global_clock/divider_clock
-    divider_cycle = 0
-    timer_counter_cycle = 0
-    timer_step_limit = 0
+    divider_step_limit = 256
+    divider_origin = 0
+    timer_cycle = 0
+    timer_step_limit = 1024
+    timer_enabled = False
 
     clock_map = {
         0: 4096,
@@ -15,32 +18,70 @@ class GameboyTimer:
         3: 16384
     }
 
-    def __init__(self, memory_bus:MemoryBus):
+    def __init__(self, memory_bus:MemoryBus, scheduler:Scheduler):
         self.memory_bus = memory_bus
+        self.scheduler = scheduler
+        self._set_timer_config(memory_bus.memory[TIMER_CONTROL])
+        memory_bus.register_timer(self)
 
-    def step(self, cycles):
-        self._step_divider(cycles)
-        self._step_timer(cycles)
+    def read_register(self, addr):
+        self.sync(self.scheduler.current_cycle())
+        return self.memory_bus.memory[addr]
 
-    def _step_divider(self, cycles):
-        self.divider_cycle += cycles
-        if self.divider_cycle > self.divider_step_limit:
-            self.divider_cycle = self.divider_cycle - self.divider_step_limit
-            self.memory_bus.inc_timer_div()
+    def write_register(self, addr, value):
+        now = self.scheduler.current_cycle()
+        self.sync(now)
+        memory = self.memory_bus.memory
 
-    def _step_timer(self, cycles):
-        self.timer_counter_cycle += cycles
-        timer_counter_control = self.memory_bus.read_byte(TIMER_CONTROL)
+        if addr == TIMER_DIV:
+            self.divider_origin = now
+            memory[TIMER_DIV] = 0x00
+        elif addr == TIMER_CONTROL:
+            memory[TIMER_CONTROL] = value & 0xFF
+            self._set_timer_config(value)
+        else:
+            memory[addr] = value & 0xFF
 
-        enabled_inc = (timer_counter_control >> 2) & 0x1
-        self._set_timer_config(timer_counter_control)
-        if self.timer_counter_cycle > self.timer_step_limit:
-            self.timer_counter_cycle = self.timer_counter_cycle - self.timer_step_limit
-            if enabled_inc:
-                self.memory_bus.inc_timer_counter()
+        self.schedule_overflow(now)
 
-    def _set_timer_config(self, timer_control):
-        clock_index = timer_control & 0b11
-        clock = self.clock_map[clock_index]
-        self.timer_step_limit = self.global_clock/clock
+    ## Called by the motherboard when the TIMER_EVENT deadline is reached
+    def update(self):
+        now = self.scheduler.now
+        self.sync(now)
+        self.schedule_overflow(now)
+
+    def sync(self, now):
+        memory = self.memory_bus.memory
+        counter = now - self.divider_origin
+        memory[TIMER_DIV] = (counter // self.divider_step_limit) & 0xFF
+
+        if self.timer_enabled:
+            ## TIMA ticks every time the internal counter crosses a multiple of the step limit
+            limit = self.timer_step_limit
+            ticks = counter // limit - (self.timer_cycle - self.divider_origin) // limit
+            if ticks > 0:
+                self._add_timer_ticks(ticks)
+
+        self.timer_cycle = now
 
+    def schedule_overflow(self, now):
+        if not self.timer_enabled:
+            self.scheduler.cancel(TIMER_EVENT)
+            return
+
+        limit = self.timer_step_limit
+        ticks_to_overflow = 0x100 - self.memory_bus.memory[TIMER_COUNTER]
+        counter = now - self.divider_origin
+        self.scheduler.schedule(TIMER_EVENT, self.divider_origin + (counter // limit + ticks_to_overflow) * limit)
+
+    def _add_timer_ticks(self, ticks):
+        memory = self.memory_bus.memory
+        value = memory[TIMER_COUNTER] + ticks
+        while value > 0xFF:
+            self.memory_bus.request_timer_interrupt()
+            value = memory[TIMER_MODULO] + value - 0x100
+        memory[TIMER_COUNTER] = value
+
+    def _set_timer_config(self, timer_control):
+        self.timer_enabled = bool((timer_control >> 2) & 0x1)
+        self.timer_step_limit = self.global_clock // self.clock_map[timer_control & 0b11]
@@ -1,27 +1,41 @@
 from emulator.core.motherboard import *
+from emulator.core.debugger import *
 from emulator.periferials.joypad import *
 from emulator.periferials.screeen import *
 from emulator.periferials.serial import *
 import time
 import pygame
 
+## Most frames the automatic frame skip leaves out in a row
+MAX_AUTO_FRAME_SKIP = 4
+
 
 class Gameboy:
     
-    def __init__(self):
-        self.screen = Screen()
+    ## A headless Gameboy never opens a window, it is meant to be driven with run_frame()
+    def __init__(self, headless=False):
+        self.screen = MockScreen() if headless else Screen()
         self.joypad = Joypad()
         self.network = SimpleNetworkAdapter()
         self.motherboard = Motherboard(self.screen, self.joypad, self.network)
+        self.debugger = Debugger(self.motherboard)
 
         self.cycles = 0
         self.time_debit = 0
         self.start_time = 0
         self.sync_cycles = 17556 * 2
         self.sync_time = (self.sync_cycles / 1e6) - 0.005
+        ## m-cycles emulated between two checks of the pygame event queue
+        self.poll_cycles = 2000
 
         self.speed_up = False
         self.link_cable = False
+        self.block_compiler = False
+        self.skip_idle_loops = False
+        self.timed_dma = False
+        self.render_interval = 1
+        self.auto_frame_skip = False
+        self.numpy_renderer = False
 
     def sync_clock(self):
         if self.cycles >= self.sync_cycles:
@@ -35,6 +49,10 @@ class Gameboy:
                 else:
                     diff = elapsed_time - self.sync_time
                     self.time_debit = diff if diff < self.sync_time else 0
+                    ## Running behind, the frames that would have been shown meanwhile are emulated without drawing them
+                    if self.auto_frame_skip:
+                        frames_behind = int(diff / (FRAME_CYCLES / 1e6)) + 1
+                        self.motherboard.ppu.skip_frames(min(frames_behind, MAX_AUTO_FRAME_SKIP))
 
             self.start_time = time.perf_counter()
 
@@ -64,47 +82,57 @@ class Gameboy:
                 self.network.stop()
 
 
-    def play(self, cartridge:Cartridge):
+    def insert_cartridge(self, cartridge:Cartridge):
         self.motherboard.insert_cartridge(cartridge)
+        self.motherboard.set_block_compiler(self.block_compiler)
+        self.motherboard.set_idle_loop_skipping(self.skip_idle_loops)
+        self.motherboard.set_timed_dma(self.timed_dma)
+        self.motherboard.set_frame_skip(self.render_interval)
+        self.motherboard.set_numpy_renderer(self.numpy_renderer)
+        if self.debugger.has_breaks():
+            self.debugger.attach()
         self.cartridge = cartridge
+
+    ## Emulates one frame as fast as possible, without wall clock sync or the pygame event queue
+    def run_frame(self):
+        return self.motherboard.run_frame()
+
+    def play(self, cartridge:Cartridge):
+        self.insert_cartridge(cartridge)
         running = True
-        count = 0
 
-        run_cycle = self.motherboard.run_cycle
+        run_until = self.motherboard.run_until
         while running:
-            count += 1
             self.sync_clock()
             self.connect_serial_link()
-            if count % 1000 == 0: 
-                count = 0
-                for event in pygame.event.get():
-                    keys = None
-                    if event.type == pygame.QUIT:
+            for event in pygame.event.get():
+                keys = None
+                if event.type == pygame.QUIT:
+                    cartridge.save_game()
+                    self.network.stop()
+                    running = False
+                
+                if event.type == pygame.KEYDOWN:
+                    keys = pygame.key.get_pressed()
+                    self.joypad.update(keys)
+                    self.joypad.key_pressed = True
+                
+                if event.type == pygame.KEYUP:
+                    keys = pygame.key.get_pressed()
+                    self.joypad.update(keys)
+
+                if keys is not None:
+                    if keys[pygame.K_LSHIFT]:
+                        self.speed_up = not self.speed_up
+                    if keys[pygame.K_s]:
+                        print("Flushing save to hard disk...")
                         cartridge.save_game()
-                        self.network.stop()
-                        running = False
-                    
-                    if event.type == pygame.KEYDOWN:
-                        keys = pygame.key.get_pressed()
-                        self.joypad.update(keys)
-                        self.joypad.key_pressed = True
-                    
-                    if event.type == pygame.KEYUP:
-                        keys = pygame.key.get_pressed()
-                        self.joypad.update(keys)
-
-                    if keys is not None:
-                        if keys[pygame.K_LSHIFT]:
-                            self.speed_up = not self.speed_up
-                        if keys[pygame.K_s]:
-                            print("Flushing save to hard disk...")
-                            cartridge.save_game()
-                        if keys[pygame.K_i]:
-                            self.link_cable = True
-                        if keys[pygame.K_p]:
-                            self.link_cable = False
-                            
-            self.cycles += run_cycle()
+                    if keys[pygame.K_i]:
+                        self.link_cable = True
+                    if keys[pygame.K_p]:
+                        self.link_cable = False
+                        
+            self.cycles += run_until(self.poll_cycles)
             
                 
 
@@ -11,7 +11,6 @@ class MockScreen:
         pass
 
 class Screen:
-    frame_buffer = bytearray(SCREEN_WIDTH * SCREEN_LENGHT * 3)
     white = (232, 252, 204)
     grey_2 = (172, 212, 144)
     grey_1 = (84, 140, 112)
@@ -30,6 +29,7 @@ class Screen:
     }
 
     def __init__(self):
+        self.frame_buffer = bytearray(SCREEN_WIDTH * SCREEN_LENGHT * 3)
         pygame.init()
         pygame.display.set_caption("Simple Gameboy")
         self.screen = pygame.display.set_mode(SCALED_SIZE)
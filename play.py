@@ -11,10 +11,28 @@ def load_rom_file(filename):
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Simple Gamboy Emulator")
     parser.add_argument("rom", help="Rom name inside folder roms")
+    parser.add_argument("--block-compiler", action="store_true", help="Compile ROM basic blocks to Python functions")
+    parser.add_argument("--skip-idle-loops", action="store_true", help="Fast-forward loops that only poll LY/STAT")
+    parser.add_argument("--timed-dma", action="store_true", help="Take 160 m-cycles to copy OAM DMA instead of copying it at once")
+    parser.add_argument("--frame-skip", type=int, default=1, help="Draw only one frame out of this many")
+    parser.add_argument("--auto-frame-skip", action="store_true", help="Skip drawing frames while the emulation runs behind real time")
+    parser.add_argument("--numpy-renderer", action="store_true", help="Draw lines with NumPy, faster on CPython (needs numpy installed)")
+    parser.add_argument("--break", dest="breakpoints", action="append", default=[], help="Stop before executing this hex address, can be repeated")
+    parser.add_argument("--watch", action="append", default=[], help="Stop before a write to this hex address, can be repeated")
 
     args = parser.parse_args()
     file_name = args.rom
 
     game = Cartridge(load_rom_file(file_name), file_name)
     gameboy = Gameboy()
+    gameboy.block_compiler = args.block_compiler
+    gameboy.skip_idle_loops = args.skip_idle_loops
+    gameboy.timed_dma = args.timed_dma
+    gameboy.render_interval = args.frame_skip
+    gameboy.auto_frame_skip = args.auto_frame_skip
+    gameboy.numpy_renderer = args.numpy_renderer
+    for addr in args.breakpoints:
+        gameboy.debugger.add_breakpoint(int(addr, 16))
+    for addr in args.watch:
+        gameboy.debugger.add_watchpoint(int(addr, 16))
     gameboy.play(game)
\ No newline at end of file